@@ -1,9 +1,24 @@
 import mysql.connector
 import pandas as pd
+import numpy as np
 from mysql.connector import Error
+from mysql.connector.errors import PoolError
 import traceback
+import os
+import sys
+import argparse
+import queue
+import threading
 import hashlib
-from datetime import datetime
+import uuid
+import functools
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import re
+import bisect
+import decimal
+import atexit
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
 import speech_recognition as sr
 import pyttsx3
 import time
@@ -11,21 +26,379 @@ import time
 # ==================================================
 # Database connection
 # ==================================================
+# Connection settings come from the environment so that credentials are not
+# kept in the source tree.
+DB_CONFIG = {
+    'host': os.environ.get('STOCKFLOW_DB_HOST', 'localhost'),
+    'port': int(os.environ.get('STOCKFLOW_DB_PORT', '3306')),
+    'user': os.environ.get('STOCKFLOW_DB_USER', 'root'),
+    'password': os.environ.get('STOCKFLOW_DB_PASSWORD', ''),
+    'database': os.environ.get('STOCKFLOW_DB_NAME', 'shopDB'),
+    'auth_plugin': 'mysql_native_password'
+}
+
+POOL_CONFIG = {
+    'max_size': int(os.environ.get('STOCKFLOW_POOL_MAX_SIZE', '10')),
+    'checkout_timeout': float(os.environ.get('STOCKFLOW_POOL_TIMEOUT', '5')),
+    'health_check_interval': float(os.environ.get('STOCKFLOW_POOL_HEALTH_CHECK', '30')),
+    'max_lifetime': float(os.environ.get('STOCKFLOW_POOL_MAX_LIFETIME', '3600'))
+}
+
+class PooledConnection:
+    """Connection checked out of a ConnectionPool.
+
+    Behaves like the underlying mysql connection, except that close() hands
+    it back to the pool instead of closing the socket.
+    """
+    def __init__(self, pool, conn, created_at):
+        self._pool = pool
+        self._conn = conn
+        self._created_at = created_at
+
+    def __getattr__(self, name):
+        conn = self.__dict__.get('_conn')
+        if conn is None:
+            raise PoolError("Connection has already been returned to the pool")
+        return getattr(conn, name)
+
+    def close(self):
+        conn = self.__dict__.get('_conn')
+        if conn is not None:
+            self._conn = None
+            self._pool.release(conn, self._created_at)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        # Error paths that never reach conn.close() still give the slot back
+        self.close()
+
+class ConnectionPool:
+    """Thread-safe pool of MySQL connections shared by all Streamlit sessions.
+
+    At most ``max_size`` connections are open at once; callers wait up to
+    ``checkout_timeout`` seconds for a free one. Idle connections are pinged
+    before reuse once they have been idle longer than ``health_check_interval``
+    and are replaced after ``max_lifetime`` seconds.
+    """
+    def __init__(self, db_config, max_size=10, checkout_timeout=5,
+                 health_check_interval=30, max_lifetime=3600):
+        self.db_config = dict(db_config)
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        self.max_lifetime = max_lifetime
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._stats = {
+            'created': 0,
+            'reused': 0,
+            'checkouts': 0,
+            'in_use': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'health_check_failures': 0,
+            'recycled': 0,
+            'discarded': 0
+        }
+
+    def _bump(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def get(self):
+        """Check out a connection, waiting up to checkout_timeout for a free slot"""
+        if not self._slots.acquire(blocking=False):
+            self._bump('waits')
+            if not self._slots.acquire(timeout=self.checkout_timeout):
+                self._bump('timeouts')
+                raise PoolError(f"No free connection after {self.checkout_timeout}s "
+                                f"(pool size {self.max_size})")
+        try:
+            conn, created_at = self._take()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._stats['in_use'] += 1
+        return PooledConnection(self, conn, created_at)
+
+    def _take(self):
+        while True:
+            try:
+                conn, created_at, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                conn = mysql.connector.connect(**self.db_config)
+                self._bump('created')
+                return conn, time.time()
+
+            now = time.time()
+            if now - created_at > self.max_lifetime:
+                self._bump('recycled')
+                self._close_quietly(conn)
+                continue
+            if now - last_used > self.health_check_interval and not self._is_healthy(conn):
+                self._bump('health_check_failures')
+                self._close_quietly(conn)
+                continue
+            self._bump('reused')
+            return conn, created_at
+
+    @staticmethod
+    def _is_healthy(conn):
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def release(self, conn, created_at):
+        """Return a connection to the pool, ending any open transaction"""
+        try:
+            # Uncommitted work is discarded, and a fresh read view is started
+            # for the next borrower.
+            conn.rollback()
+            self._idle.put((conn, created_at, time.time()))
+        except Exception:
+            self._bump('discarded')
+            self._close_quietly(conn)
+        finally:
+            with self._lock:
+                self._stats['in_use'] -= 1
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['idle'] = self._idle.qsize()
+        stats['max_size'] = self.max_size
+        return stats
+
+    def close_all(self):
+        while True:
+            try:
+                conn, _, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._close_quietly(conn)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_CONFIG, **POOL_CONFIG)
+    return _pool
+
 def get_connection():
     try:
-        conn = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="Soda@2005",
-            database="shopDB",
-            auth_plugin='mysql_native_password'
-        )
-        return conn
+        return get_pool().get()
     except Error as e:
         print("❌ DB connection failed:", e)
         traceback.print_exc()
         return None
 
+def get_pool_stats():
+    return get_pool().stats()
+
+# ==================================================
+# Catalog read cache
+# ==================================================
+CACHE_CONFIG = {
+    'ttl': float(os.environ.get('STOCKFLOW_CACHE_TTL', '60')),
+    'max_entries': int(os.environ.get('STOCKFLOW_CACHE_MAX_ENTRIES', '256'))
+}
+
+class VersionedCache:
+    """In-process cache for catalog reads, shared by all Streamlit sessions.
+
+    Every entry is stored under the data version current when its load
+    started. Write paths call bump(), which moves readers to a new version
+    at once; a load that raced with a write is not stored. The TTL bounds
+    staleness from changes made outside this process.
+    """
+    def __init__(self, ttl=60, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._version = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    @property
+    def version(self):
+        return self._version
+
+    def bump(self):
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+            self._stats['invalidations'] += 1
+
+    def get_or_load(self, key, loader):
+        with self._lock:
+            version = self._version
+            entry = self._entries.get((version, key))
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self._entries.move_to_end((version, key))
+                self._stats['hits'] += 1
+                return entry[1]
+            self._stats['misses'] += 1
+        
+        value = loader()
+        # Failed loads come back as empty frames; don't pin them for a whole TTL
+        if _is_empty_result(value):
+            return value
+        with self._lock:
+            if version == self._version:
+                self._entries[(version, key)] = (time.monotonic(), value)
+                self._entries.move_to_end((version, key))
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['version'] = self._version
+        return stats
+
+catalog_cache = VersionedCache(**CACHE_CONFIG)
+
+def _is_empty_result(value):
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    return value is None or (isinstance(value, pd.DataFrame) and value.empty)
+
+def _copy_result(value):
+    if isinstance(value, pd.DataFrame):
+        return value.copy()
+    if isinstance(value, tuple):
+        return tuple(_copy_result(item) for item in value)
+    return value
+
+def cached_read(func):
+    """Serve a read function from catalog_cache, keyed on its arguments.
+
+    DataFrames (also inside tuple results) are copied on the way out
+    because callers modify them.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (func.__name__, args, tuple(sorted(kwargs.items())))
+        value = catalog_cache.get_or_load(key, lambda: func(*args, **kwargs))
+        return _copy_result(value)
+    return wrapper
+
+def invalidate_catalog_cache():
+    catalog_cache.bump()
+    response_cache.bump()
+
+def get_data_version():
+    return catalog_cache.version
+
+def get_cache_stats():
+    return catalog_cache.stats()
+
+# ==================================================
+# Write-behind buffers
+# ==================================================
+class WriteBehindBuffer:
+    """Collects rows in memory and writes them to the database in batches.
+
+    add() only appends to a queue. A background thread calls
+    ``writer(rows)`` once ``batch_size`` rows are waiting or every
+    ``flush_interval`` seconds; writer returns True when the rows are
+    stored. A failed batch stays queued for the next attempt. Beyond
+    ``max_pending`` queued rows the oldest are dropped and counted, so a
+    database outage cannot grow the process without bound. Pending rows
+    are flushed at interpreter exit.
+    """
+    def __init__(self, name, writer, batch_size=200, flush_interval=1.0, max_pending=10000):
+        self.name = name
+        self.writer = writer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._stats = {'added': 0, 'written': 0, 'batches': 0, 'failed_batches': 0, 'dropped': 0}
+
+    def add(self, row):
+        with self._lock:
+            self._pending.append(row)
+            self._stats['added'] += 1
+            self._trim()
+            full = len(self._pending) >= self.batch_size
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"{self.name}-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+        if full:
+            self._wakeup.set()
+
+    def _trim(self):
+        while len(self._pending) > self.max_pending:
+            self._pending.popleft()
+            self._stats['dropped'] += 1
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Write all pending rows now; returns False if a batch failed"""
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                if not batch:
+                    return True
+                try:
+                    ok = self.writer(batch)
+                except Exception as e:
+                    print(f"❌ {self.name} write error:", e)
+                    traceback.print_exc()
+                    ok = False
+                with self._lock:
+                    if ok:
+                        self._stats['written'] += len(batch)
+                        self._stats['batches'] += 1
+                    else:
+                        self._stats['failed_batches'] += 1
+                        self._pending.extendleft(reversed(batch))
+                        self._trim()
+                if not ok:
+                    return False
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+        return stats
+
 # ==================================================
 # Security & Hashing
 # ==================================================
@@ -71,6 +444,7 @@ def register_user(username, password, role):
         cur.execute("INSERT INTO users (username, password, role) VALUES (%s, SHA2(%s, 256), %s)", 
                    (username, password, role))
         conn.commit()
+        record_activity('user_registered', f"New {role} registered: {username}", cur.lastrowid)
         cur.close()
         conn.close()
         return True, "Registration successful!"
@@ -113,47 +487,136 @@ def delete_user(user_id):
 # ==================================================
 # Dashboard Analytics
 # ==================================================
-def get_dashboard_metrics():
+# Period-over-period changes compare against the snapshot this many days old
+METRICS_CHANGE_DAYS = int(os.environ.get('STOCKFLOW_METRICS_CHANGE_DAYS', '30'))
+_last_snapshot_date = None
+
+def _adjust_product_count(cur, delta):
+    """Keep metrics_summary.total_products in step with product inserts/deletes"""
+    if delta:
+        cur.execute("UPDATE metrics_summary SET total_products = total_products + %s WHERE id = 1", (delta,))
+
+def _is_new_customer(cur, user_id):
+    """True if user_id has no purchases yet, checked inside the purchase transaction.
+
+    The user's row is locked first, so concurrent first purchases by one user
+    run this one at a time, and purchases is read with a locking read, which
+    sees the other transaction's committed order instead of our snapshot.
+    """
+    cur.execute("SELECT id FROM users WHERE id = %s FOR UPDATE", (user_id,))
+    cur.fetchall()
+    cur.execute("SELECT 1 FROM purchases WHERE user_id = %s LIMIT 1 LOCK IN SHARE MODE", (user_id,))
+    return not cur.fetchall()
+
+def _record_sale_metrics(cur, orders, revenue, new_customers):
+    """Add a completed sale to metrics_summary inside the purchase transaction.
+
+    Run this last before commit: it locks the single summary row, so keeping
+    it at the end of the transaction keeps concurrent purchases moving.
+    """
+    cur.execute("""
+        UPDATE metrics_summary
+        SET total_orders = total_orders + %s,
+            revenue = revenue + %s,
+            active_customers = active_customers + %s
+        WHERE id = 1
+    """, (orders, revenue, new_customers))
+
+def rebuild_metrics_summary():
+    """Recompute metrics_summary from the product and purchases tables"""
     try:
         conn = get_connection()
         if conn is None:
-            return default_metrics()
+            return False
         
         cur = conn.cursor()
+        cur.execute("""
+            REPLACE INTO metrics_summary (id, total_products, total_orders, active_customers, revenue)
+            SELECT 1,
+                   (SELECT COUNT(*) FROM product),
+                   COUNT(*),
+                   COUNT(DISTINCT user_id),
+                   COALESCE(SUM(price * quantity), 0)
+            FROM purchases
+        """)
+        conn.commit()
+        cur.close()
+        conn.close()
+        return True
+    except Exception as e:
+        print("❌ rebuild_metrics_summary error:", e)
+        traceback.print_exc()
+        return False
+
+def _percent_change(current, previous):
+    if not previous:
+        return 0
+    return round((float(current) - float(previous)) / float(previous) * 100)
+
+def _read_dashboard_metrics():
+    """Dashboard totals read from the one-row metrics_summary table, or None on failure.
+
+    The *_change figures compare against the stored snapshot from
+    METRICS_CHANGE_DAYS ago, or the oldest earlier snapshot while less
+    history exists. Today's snapshot is taken on the first read of the day.
+    """
+    global _last_snapshot_date
+    try:
+        conn = get_connection()
+        if conn is None:
+            return None
         
-        # Total products
-        cur.execute("SELECT COUNT(*) FROM product")
-        total_products = cur.fetchone()[0]
-        
-        # Total orders
-        cur.execute("SELECT COUNT(*) FROM orders")
-        total_orders = cur.fetchone()[0]
-        
-        # Active customers
-        cur.execute("SELECT COUNT(DISTINCT Customer_ID) FROM orders WHERE Order_Status='Completed'")
-        active_customers = cur.fetchone()[0]
-        
-        # Revenue
-        cur.execute("SELECT COALESCE(SUM(Total_Price), 0) FROM orders WHERE Order_Status='Completed'")
-        revenue = cur.fetchone()[0] or 0
+        cur = conn.cursor()
+        today = datetime.now().date()
+        if _last_snapshot_date != today:
+            cur.execute("""
+                INSERT IGNORE INTO metrics_snapshot
+                    (snapshot_date, total_products, total_orders, active_customers, revenue)
+                SELECT %s, total_products, total_orders, active_customers, revenue
+                FROM metrics_summary WHERE id = 1
+            """, (today,))
+            conn.commit()
+            _last_snapshot_date = today
         
+        cur.execute("""
+            SELECT s.total_products, s.total_orders, s.active_customers, s.revenue,
+                   b.total_products, b.total_orders, b.active_customers, b.revenue
+            FROM metrics_summary s
+            LEFT JOIN metrics_snapshot b ON b.snapshot_date = COALESCE(
+                (SELECT MAX(snapshot_date) FROM metrics_snapshot WHERE snapshot_date <= %s),
+                (SELECT MIN(snapshot_date) FROM metrics_snapshot WHERE snapshot_date < %s))
+            WHERE s.id = 1
+        """, (today - timedelta(days=METRICS_CHANGE_DAYS), today))
+        row = cur.fetchone()
         cur.close()
         conn.close()
         
+        if row is None:
+            # Summary not seeded yet
+            if rebuild_metrics_summary():
+                return _read_dashboard_metrics()
+            return None
+        
+        total_products, total_orders, active_customers, revenue = row[:4]
+        prev_products, prev_orders, prev_customers, prev_revenue = row[4:]
         return {
             'total_products': total_products,
             'total_orders': total_orders,
             'active_customers': active_customers,
             'revenue': revenue,
-            'products_change': 12,
-            'orders_change': 8,
-            'customers_change': 5,
-            'revenue_change': 15
+            'products_change': _percent_change(total_products, prev_products),
+            'orders_change': _percent_change(total_orders, prev_orders),
+            'customers_change': _percent_change(active_customers, prev_customers),
+            'revenue_change': _percent_change(revenue, prev_revenue)
         }
     except Exception as e:
         print("❌ get_dashboard_metrics error:", e)
         traceback.print_exc()
-        return default_metrics()
+        return None
+
+def get_dashboard_metrics():
+    """Dashboard totals (see _read_dashboard_metrics), or sample figures on failure"""
+    return _read_dashboard_metrics() or default_metrics()
 
 def default_metrics():
     return {
@@ -167,43 +630,249 @@ def default_metrics():
         'revenue_change': 15
     }
 
-def get_sales_overview():
+# SQL expressions mapping a rollup date to the start of its period
+SALES_PERIODS = {
+    'day': "r.sale_date",
+    'week': "DATE_SUB(r.sale_date, INTERVAL WEEKDAY(r.sale_date) DAY)",
+    'month': "MAKEDATE(YEAR(r.sale_date), 1) + INTERVAL (MONTH(r.sale_date) - 1) MONTH",
+    'year': "MAKEDATE(YEAR(r.sale_date), 1)"
+}
+
+def _record_daily_sales(cur, sale_date, lines):
+    """Add purchase lines [(product_id, revenue, units), ...] to sales_daily.
+
+    Runs inside the purchase transaction; category and brand are taken
+    from the product row. Lines are summed per (category, brand) and
+    written with one upsert, in key order so concurrent checkouts lock the
+    sales_daily rows in the same order.
+    """
+    if not lines:
+        return
+    product_ids = sorted({line[0] for line in lines})
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    cur.execute(f"SELECT Product_ID, Unit_Type, Brand_ID FROM product WHERE Product_ID IN ({placeholders})",
+                product_ids)
+    keys = {product_id: (category or 'Unknown', brand_id or 0) for product_id, category, brand_id in cur.fetchall()}
+    totals = {}
+    for product_id, revenue, units in lines:
+        if product_id not in keys:
+            continue
+        total = totals.setdefault(keys[product_id], [0.0, 0, 0])
+        total[0] += float(revenue)
+        total[1] += int(units)
+        total[2] += 1
+    if not totals:
+        return
+    changes = sorted(totals.items())
+    cur.execute(f"""
+        INSERT INTO sales_daily (sale_date, category, brand_id, revenue, units, orders)
+        VALUES {", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(changes))}
+        ON DUPLICATE KEY UPDATE
+            revenue = revenue + VALUES(revenue),
+            units = units + VALUES(units),
+            orders = orders + VALUES(orders)
+    """, [value for key, total in changes for value in (sale_date,) + key + tuple(total)])
+
+def rebuild_sales_rollup(start=None, end=None):
+    """Recompute sales_daily from purchases, one month per transaction.
+
+    start/end (dates, inclusive) limit the rebuild; by default every month
+    with purchases is rebuilt. Returns the number of months processed, or
+    None on failure.
+    """
     try:
         conn = get_connection()
         if conn is None:
-            return pd.DataFrame({'month': ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun'], 
-                               'sales': [12000, 19000, 15000, 25000, 22000, 30000]})
+            return None
         
-        # Get sales data from orders
-        query = """
-        SELECT MONTHNAME(Date_Order) as month, SUM(Total_Price) as sales
-        FROM orders 
-        WHERE Order_Status = 'Completed'
-        GROUP BY MONTH(Date_Order)
-        ORDER BY MONTH(Date_Order)
-        LIMIT 6
-        """
-        df = pd.read_sql(query, conn)
+        cur = conn.cursor()
+        if start is None or end is None:
+            cur.execute("SELECT DATE(MIN(purchase_date)), DATE(MAX(purchase_date)) FROM purchases")
+            first, last = cur.fetchone()
+            if first is None:
+                cur.close()
+                conn.close()
+                return 0
+            start = start or first
+            end = end or last
+        
+        months = 0
+        month_start = start.replace(day=1)
+        while month_start <= end:
+            next_month = (month_start + timedelta(days=32)).replace(day=1)
+            range_start = max(month_start, start)
+            range_end = min(next_month - timedelta(days=1), end)
+            cur.execute("DELETE FROM sales_daily WHERE sale_date BETWEEN %s AND %s", (range_start, range_end))
+            cur.execute("""
+                INSERT INTO sales_daily (sale_date, category, brand_id, revenue, units, orders)
+                SELECT DATE(pu.purchase_date),
+                       COALESCE(p.Unit_Type, 'Unknown'),
+                       COALESCE(p.Brand_ID, 0),
+                       SUM(pu.price * pu.quantity),
+                       SUM(pu.quantity),
+                       COUNT(*)
+                FROM purchases pu
+                LEFT JOIN product p ON p.Product_ID = pu.product_id
+                WHERE pu.purchase_date >= %s AND pu.purchase_date < %s
+                GROUP BY DATE(pu.purchase_date), COALESCE(p.Unit_Type, 'Unknown'), COALESCE(p.Brand_ID, 0)
+            """, (range_start, range_end + timedelta(days=1)))
+            conn.commit()
+            months += 1
+            month_start = next_month
+        
+        invalidate_catalog_cache()
+        cur.close()
         conn.close()
-        return df
+        return months
     except Exception as e:
-        print("❌ get_sales_overview error:", e)
-        return pd.DataFrame({'month': ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun'], 
-                           'sales': [12000, 19000, 15000, 25000, 22000, 30000]})
+        print("❌ rebuild_sales_rollup error:", e)
+        traceback.print_exc()
+        return None
 
-def get_product_categories():
+@cached_read
+def get_sales(start, end, granularity='day', category=None, brand=None):
+    """Sales totals per period between start and end (dates, inclusive).
+
+    Answered from the sales_daily rollup, so the cost depends on the number
+    of days in range rather than on the number of orders. granularity is
+    'day', 'week', 'month' or 'year'. Returns a DataFrame with period,
+    sales, units and orders (empty when nothing sold), or None if the
+    query failed.
+    """
     try:
         conn = get_connection()
         if conn is None:
-            return default_categories()
+            return None
         
-        query = "SELECT Unit_Type as category, COUNT(*) as count FROM product GROUP BY Unit_Type"
-        df = pd.read_sql(query, conn)
+        period = SALES_PERIODS.get(granularity, SALES_PERIODS['day'])
+        query = f"""
+            SELECT {period} AS period,
+                   SUM(r.revenue) AS sales,
+                   SUM(r.units) AS units,
+                   SUM(r.orders) AS orders
+            FROM sales_daily r
+        """
+        params = [start, end]
+        where = ["r.sale_date BETWEEN %s AND %s"]
+        if category:
+            where.append("r.category = %s")
+            params.append(category)
+        if brand:
+            query += " JOIN brand b ON b.Brand_ID = r.brand_id"
+            where.append("b.Brand_name = %s")
+            params.append(brand)
+        query += " WHERE " + " AND ".join(where) + " GROUP BY period ORDER BY period"
+        df = pd.read_sql(query, conn, params=params)
         conn.close()
+        df['period'] = pd.to_datetime(df['period'])
         return df
     except Exception as e:
-        print("❌ get_product_categories error:", e)
+        print("❌ get_sales error:", e)
+        traceback.print_exc()
+        return None
+
+# Sales chart ranges: key -> (label, periods of granularity back or None for all history, granularity)
+SALES_CHART_RANGES = {
+    '6m': ("Last 6 months", 6, 'month'),
+    '90d': ("Last 90 days", 90, 'day'),
+    '1y': ("Last 12 months", 365, 'day'),
+    'all': ("All time", None, 'day')
+}
+SALES_CHART_MAX_POINTS = int(os.environ.get('STOCKFLOW_CHART_MAX_POINTS', '400'))
+
+def downsample_lttb(x, y, max_points):
+    """Indices of at most max_points points chosen by Largest-Triangle-Three-Buckets.
+
+    Keeps the first and last point and, from each bucket in between, the
+    point forming the largest triangle with the previously kept point and
+    the average of the next bucket, which preserves peaks and dips.
+    """
+    n = len(x)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    every = (n - 2) / (max_points - 2)
+    indices = np.empty(max_points, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(max_points - 2):
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        next_start, next_end = end, min(int((i + 2) * every) + 1, n)
+        avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        indices[i + 1] = a
+    return indices
+
+def downsample_minmax(y, max_points):
+    """Indices of the minimum and maximum of each of max_points // 2 equal buckets"""
+    n = len(y)
+    if max_points >= n or max_points < 2:
+        return np.arange(n)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(0, n, max_points // 2 + 1).astype(int)
+    indices = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end > start:
+            bucket = y[start:end]
+            indices.extend((start + int(np.argmin(bucket)), start + int(np.argmax(bucket))))
+    return np.unique(indices)
+
+def get_sales_chart(range_key='6m', max_points=None, method='lttb'):
+    """Sales series for the dashboard chart over a SALES_CHART_RANGES range.
+
+    Daily series longer than max_points (default SALES_CHART_MAX_POINTS)
+    are downsampled server-side with 'lttb' or 'minmax' before they reach
+    the browser. Returns a DataFrame with period and sales; raises if the
+    query failed, so the dashboard shows its degraded-data warning.
+    """
+    _, periods, granularity = SALES_CHART_RANGES.get(range_key, SALES_CHART_RANGES['6m'])
+    max_points = max_points or SALES_CHART_MAX_POINTS
+    today = datetime.now().date()
+    if periods is None:
+        start = datetime(2000, 1, 1).date()
+    elif granularity == 'month':
+        # The current month plus periods - 1 full months before it
+        start = today.replace(day=1)
+        for _ in range(periods - 1):
+            start = (start - timedelta(days=1)).replace(day=1)
+    else:
+        start = today - timedelta(days=periods)
+    df = get_sales(start, today, granularity)
+    if df is None:
+        raise RuntimeError("sales query failed")
+    df = df[['period', 'sales']]
+    if len(df) > max_points:
+        if method == 'minmax':
+            indices = downsample_minmax(df['sales'], max_points)
+        else:
+            indices = downsample_lttb(df['period'].astype('int64'), df['sales'], max_points)
+        df = df.iloc[indices].reset_index(drop=True)
+    return df
+
+def default_sales_chart():
+    today = datetime.now().date().replace(day=1)
+    months = [today]
+    for _ in range(5):
+        months.insert(0, (months[0] - timedelta(days=1)).replace(day=1))
+    return pd.DataFrame({'period': pd.to_datetime(months),
+                         'sales': [12000, 19000, 15000, 25000, 22000, 30000]})
+
+def _read_product_categories():
+    """Product count per category, summed from inventory_aggregates, or None on failure"""
+    df = _read_inventory_aggregates()
+    if df is None:
+        return None
+    return (df.groupby('category', as_index=False)['product_count'].sum()
+              .rename(columns={'product_count': 'count'}))
+
+def get_product_categories():
+    """Product count per category, or sample categories when there are none"""
+    df = _read_product_categories()
+    if df is None or df.empty:
         return default_categories()
+    return df
 
 def default_categories():
     return pd.DataFrame({
@@ -211,66 +880,346 @@ def default_categories():
         'count': [5, 6, 2, 2, 1, 1]
     })
 
-def get_recent_activity():
-    activities = [
-        {'icon': '📦', 'text': 'New order #1016 placed', 'time': '2 mins ago'},
-        {'icon': '💰', 'text': 'Payment received for order #1015', 'time': '15 mins ago'},
-        {'icon': '🔄', 'text': 'Stock updated for Galaxy S24', 'time': '1 hour ago'},
-        {'icon': '👤', 'text': 'New customer registered', 'time': '2 hours ago'},
-        {'icon': '📊', 'text': 'Monthly report generated', 'time': '5 hours ago'}
-    ]
-    return activities
+ACTIVITY_CONFIG = {
+    'batch_size': int(os.environ.get('STOCKFLOW_ACTIVITY_BATCH_SIZE', '200')),
+    'flush_interval': float(os.environ.get('STOCKFLOW_ACTIVITY_FLUSH_INTERVAL', '1'))
+}
+
+ACTIVITY_ICONS = {
+    'purchase': '📦',
+    'product_added': '🆕',
+    'stock_updated': '🔄',
+    'user_registered': '👤',
+    'message': '💬'
+}
 
-def get_top_products():
+def _write_activity_events(rows):
+    conn = get_connection()
+    if conn is None:
+        return False
+    
+    cur = conn.cursor()
+    cur.executemany("""
+        INSERT INTO activity_events (created_at, event_type, user_id, message)
+        VALUES (%s, %s, %s, %s)
+    """, rows)
+    conn.commit()
+    cur.close()
+    conn.close()
+    return True
+
+activity_log = WriteBehindBuffer('activity_log', _write_activity_events, **ACTIVITY_CONFIG)
+
+def record_activity(event_type, message, user_id=None):
+    """Queue an event for the activity feed; written in batches after the caller's commit"""
+    activity_log.add((datetime.now(), event_type, user_id, message[:255]))
+
+def _activity_rows(rows):
+    return [{'id': event_id, 'icon': ACTIVITY_ICONS.get(event_type, '📌'), 'text': message, 'time': created_at}
+            for event_id, created_at, event_type, message in rows]
+
+def get_activity_since(after_id=0, limit=50):
+    """Events with id greater than after_id, oldest first, at most limit.
+
+    Pass the id of the newest event already shown to fetch only what is
+    new; the primary key makes this a short range scan however long the
+    log grows.
+    """
     try:
         conn = get_connection()
         if conn is None:
-            return pd.DataFrame({
-                'product': ['iPhone 15 Pro', 'Galaxy S24 Ultra', 'MacBook Pro', 'Sony Bravia', 'Canon R5'],
-                'price': [129999, 89999, 199999, 149999, 329999]
-            })
+            return []
         
-        query = """
-        SELECT Model as product, Total_Price as price 
-        FROM product 
-        ORDER BY Total_Price DESC 
-        LIMIT 5
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT id, created_at, event_type, message
+            FROM activity_events
+            WHERE id > %s
+            ORDER BY id
+            LIMIT %s
+        """, (after_id, int(limit)))
+        rows = cur.fetchall()
+        cur.close()
+        conn.close()
+        return _activity_rows(rows)
+    except Exception as e:
+        print("❌ get_activity_since error:", e)
+        traceback.print_exc()
+        return []
+
+def get_recent_activity(limit=5):
+    """The newest events, newest first"""
+    try:
+        conn = get_connection()
+        if conn is None:
+            return []
+        
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT id, created_at, event_type, message
+            FROM activity_events
+            ORDER BY id DESC
+            LIMIT %s
+        """, (int(limit),))
+        rows = cur.fetchall()
+        cur.close()
+        conn.close()
+        return _activity_rows(rows)
+    except Exception as e:
+        print("❌ get_recent_activity error:", e)
+        traceback.print_exc()
+        return []
+
+# Leaderboard windows; product_sales_hourly keeps at least the longest one
+TOP_SELLER_WINDOWS = {
+    '24h': timedelta(hours=24),
+    '7d': timedelta(days=7),
+    '30d': timedelta(days=30)
+}
+TOP_SELLER_SORTS = {'units': 'units', 'revenue': 'revenue'}
+
+def _sales_hour(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+def _record_product_sales(cur, sale_time, lines):
+    """Add purchase lines [(product_id, revenue, units), ...] to the hourly
+    per-product counters inside the purchase transaction."""
+    if not lines:
+        return
+    hour = _sales_hour(sale_time)
+    cur.execute(f"""
+        INSERT INTO product_sales_hourly (sale_hour, product_id, units, revenue)
+        VALUES {", ".join(["(%s, %s, %s, %s)"] * len(lines))}
+        ON DUPLICATE KEY UPDATE
+            units = units + VALUES(units),
+            revenue = revenue + VALUES(revenue)
+    """, [value for product_id, revenue, units in lines for value in (hour, product_id, units, revenue)])
+
+def rebuild_top_sellers(days=None):
+    """Recompute product_sales_hourly for the last ``days`` days from purchases.
+
+    Buckets older than that are dropped, so this also serves as the periodic
+    cleanup. Defaults to the longest leaderboard window. Returns True on
+    success.
+    """
+    if days is None:
+        days = max(TOP_SELLER_WINDOWS.values()).days
+    try:
+        conn = get_connection()
+        if conn is None:
+            return False
+        
+        cur = conn.cursor()
+        since = _sales_hour(datetime.now() - timedelta(days=days))
+        cur.execute("DELETE FROM product_sales_hourly WHERE sale_hour < %s", (since,))
+        conn.commit()
+        cur.execute("DELETE FROM product_sales_hourly WHERE sale_hour >= %s", (since,))
+        cur.execute("""
+            INSERT INTO product_sales_hourly (sale_hour, product_id, units, revenue)
+            SELECT DATE_FORMAT(purchase_date, '%%Y-%%m-%%d %%H:00:00'), product_id,
+                   SUM(quantity), SUM(price * quantity)
+            FROM purchases
+            WHERE purchase_date >= %s
+            GROUP BY DATE_FORMAT(purchase_date, '%%Y-%%m-%%d %%H:00:00'), product_id
+        """, (since,))
+        conn.commit()
+        invalidate_catalog_cache()
+        cur.close()
+        conn.close()
+        return True
+    except Exception as e:
+        print("❌ rebuild_top_sellers error:", e)
+        traceback.print_exc()
+        return False
+
+@cached_read
+def _query_top_sellers(window='7d', by='units', limit=5):
+    try:
+        conn = get_connection()
+        if conn is None:
+            return None
+        
+        since = _sales_hour(datetime.now() - TOP_SELLER_WINDOWS.get(window, TOP_SELLER_WINDOWS['7d']))
+        order = TOP_SELLER_SORTS.get(by, 'units')
+        query = f"""
+        SELECT p.Model as product, t.units, t.revenue
+        FROM (
+            SELECT product_id, SUM(units) AS units, SUM(revenue) AS revenue
+            FROM product_sales_hourly
+            WHERE sale_hour >= %s
+            GROUP BY product_id
+            ORDER BY {order} DESC
+            LIMIT %s
+        ) t
+        JOIN product p ON p.Product_ID = t.product_id
+        ORDER BY t.{order} DESC
         """
-        df = pd.read_sql(query, conn)
+        df = pd.read_sql(query, conn, params=(since, int(limit)))
         conn.close()
         return df
     except Exception as e:
         print("❌ get_top_products error:", e)
-        return pd.DataFrame({
-            'product': ['iPhone 15', 'Galaxy S24', 'ROG Zephyrus', 'ThinkPad X1', 'EOS R5'],
-            'price': [129999, 79999, 149999, 134999, 329999]
-        })
+        return None
+
+def get_top_products(window='7d', by='units', limit=5):
+    """Best sellers over a TOP_SELLER_WINDOWS window, ranked by units or revenue.
+
+    Summed from the hourly counters in product_sales_hourly, so the cost
+    depends on the window length and the number of products sold in it,
+    not on the size of the purchases table. The window starts on the hour.
+    Returns a DataFrame with product, units and revenue.
+    """
+    df = _query_top_sellers(window, by, limit)
+    if df is None:
+        return default_top_products()
+    return df
+
+def default_top_products():
+    return pd.DataFrame({
+        'product': ['iPhone 15 Pro', 'Galaxy S24 Ultra', 'MacBook Pro', 'Sony Bravia', 'Canon R5'],
+        'units': [42, 35, 21, 12, 8],
+        'revenue': [5459958, 3149965, 4199979, 1799988, 2639992]
+    })
+
+# Panels loaded by load_dashboard(): name -> (loader, fallback on timeout or error).
+# Loaders raise or return None on failure; they must not apply their own
+# fallback, or load_dashboard cannot report the panel as degraded.
+DASHBOARD_QUERIES = {
+    'metrics': (_read_dashboard_metrics, default_metrics),
+    'sales_chart': (get_sales_chart, default_sales_chart),
+    'categories': (_read_product_categories, default_categories),
+    'top_products': (_query_top_sellers, default_top_products)
+}
+
+DASHBOARD_CONFIG = {
+    'workers': int(os.environ.get('STOCKFLOW_DASHBOARD_WORKERS', '4')),
+    'timeout': float(os.environ.get('STOCKFLOW_DASHBOARD_TIMEOUT', '5'))
+}
+
+_dashboard_executor = None
+_dashboard_executor_lock = threading.Lock()
+
+def _get_dashboard_executor():
+    global _dashboard_executor
+    if _dashboard_executor is None:
+        with _dashboard_executor_lock:
+            if _dashboard_executor is None:
+                _dashboard_executor = ThreadPoolExecutor(max_workers=DASHBOARD_CONFIG['workers'],
+                                                         thread_name_prefix='dashboard')
+    return _dashboard_executor
+
+def _timed(loader, kwargs):
+    started = time.perf_counter()
+    value = loader(**kwargs)
+    return value, time.perf_counter() - started
+
+def load_dashboard(timeout=None, **query_args):
+    """Run the admin dashboard queries concurrently and return them as one bundle.
+
+    Each query runs on its own pooled connection in a shared, bounded thread
+    pool, so the dashboard waits for the slowest query instead of the sum of
+    all of them. A query that raises, returns None or is not done within
+    ``timeout`` seconds of submission is replaced by its fallback. The bundle holds one entry
+    per DASHBOARD_QUERIES name plus 'timings' (seconds per query, None when
+    it timed out or failed), 'timed_out', 'failed' and 'total_seconds'.
+    
+    Keyword arguments named after a query pass a dict of arguments to it,
+    e.g. ``load_dashboard(top_products={'window': '24h', 'by': 'revenue'})``.
+    """
+    timeout = DASHBOARD_CONFIG['timeout'] if timeout is None else timeout
+    started = time.perf_counter()
+    deadline = started + timeout
+    executor = _get_dashboard_executor()
+    futures = {name: executor.submit(_timed, loader, query_args.get(name, {}))
+               for name, (loader, _) in DASHBOARD_QUERIES.items()}
+    
+    bundle = {'timings': {}, 'timed_out': [], 'failed': []}
+    for name, future in futures.items():
+        fallback = DASHBOARD_QUERIES[name][1]
+        try:
+            value, seconds = future.result(timeout=max(0, deadline - time.perf_counter()))
+            if value is None:
+                raise RuntimeError("query returned no data")
+            bundle[name], bundle['timings'][name] = value, seconds
+        except FutureTimeoutError:
+            # A running query finishes in the background and returns its connection
+            future.cancel()
+            print(f"⚠ load_dashboard: {name} timed out after {timeout}s")
+            bundle[name] = fallback()
+            bundle['timings'][name] = None
+            bundle['timed_out'].append(name)
+        except Exception as e:
+            print(f"❌ load_dashboard {name} error:", e)
+            traceback.print_exc()
+            bundle[name] = fallback()
+            bundle['timings'][name] = None
+            bundle['failed'].append(name)
+    bundle['total_seconds'] = time.perf_counter() - started
+    return bundle
 
 # ==================================================
 # Product Management
 # ==================================================
-def get_products():
-    try:
-        conn = get_connection()
-        if conn is None:
-            return pd.DataFrame()
+# Default reorder threshold: products below it count as low stock unless
+# their category (reorder_thresholds) or the product (Reorder_Level) sets one
+LOW_STOCK_THRESHOLD = 10
 
-        query = """
+# Effective threshold of product p; needs THRESHOLD_JOIN
+THRESHOLD_SQL = f"COALESCE(p.Reorder_Level, t.threshold, {LOW_STOCK_THRESHOLD})"
+THRESHOLD_JOIN = "LEFT JOIN reorder_thresholds t ON t.category = p.Unit_Type"
+
+PRODUCT_SELECT = f"""
         SELECT p.Product_ID AS id,
                p.Model AS name,
                b.Brand_name AS brand,
                p.Total_Price AS price,
                CASE 
-                   WHEN p.Stock_Qty > 10 THEN 'In Stock'
+                   WHEN p.Stock_Qty >= {THRESHOLD_SQL} THEN 'In Stock'
                    WHEN p.Stock_Qty > 0 THEN 'Low Stock'
                    ELSE 'Out of Stock'
                END AS stock_status,
                p.Stock_Qty AS stock,
-               p.Unit_Type AS category
+               p.Unit_Type AS category,
+               {THRESHOLD_SQL} AS reorder_level
         FROM product p
         LEFT JOIN brand b ON p.Brand_ID = b.Brand_ID
+        {THRESHOLD_JOIN}
         """
-        df = pd.read_sql(query, conn)
+
+# Keyset sort orders: (column, direction, cursor field); ties are broken by Product_ID
+PRODUCT_SORTS = {
+    'name': ('p.Model', 'ASC', 'name'),
+    'price': ('p.Total_Price', 'ASC', 'price'),
+    'price_desc': ('p.Total_Price', 'DESC', 'price'),
+    'stock': ('p.Stock_Qty', 'ASC', 'stock')
+}
+
+def _product_filters(category=None, in_stock_only=False, search=None):
+    """Build the WHERE clause shared by the catalog queries"""
+    where = []
+    params = []
+    if category:
+        where.append("p.Unit_Type = %s")
+        params.append(category)
+    if in_stock_only:
+        where.append("p.Stock_Qty > 0")
+    if search:
+        where.append("(p.Model LIKE %s OR b.Brand_name LIKE %s OR p.Unit_Type LIKE %s)")
+        params.extend([f"%{search}%"] * 3)
+    return where, params
+
+@cached_read
+def get_products(category=None, in_stock_only=False, search=None):
+    try:
+        conn = get_connection()
+        if conn is None:
+            return pd.DataFrame()
+
+        where, params = _product_filters(category, in_stock_only, search)
+        query = PRODUCT_SELECT
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        df = pd.read_sql(query, conn, params=params)
         conn.close()
         return df
     except Exception as e:
@@ -278,108 +1227,1605 @@ def get_products():
         traceback.print_exc()
         return pd.DataFrame()
 
-def add_product(brand_name, model, price, category, stock, supplier_id):
+@cached_read
+def get_product(product_id):
+    """One product row as a dict (PRODUCT_SELECT columns), or None"""
     try:
         conn = get_connection()
         if conn is None:
-            return False
-        
-        cur = conn.cursor()
+            return None
         
-        # First, get or create brand
-        cur.execute("SELECT Brand_ID FROM brand WHERE Brand_name = %s", (brand_name,))
-        result = cur.fetchone()
-        if result:
-            brand_id = result[0]
-        else:
-            cur.execute("INSERT INTO brand (Brand_name, Date_Rec) VALUES (%s, %s)", 
-                       (brand_name, datetime.now().date()))
-            brand_id = cur.lastrowid
+        df = pd.read_sql(PRODUCT_SELECT + " WHERE p.Product_ID = %s", conn, params=[int(product_id)])
+        conn.close()
+        return df.iloc[0].to_dict() if not df.empty else None
+    except Exception as e:
+        print("❌ get_product error:", e)
+        traceback.print_exc()
+        return None
+
+def _to_python(value):
+    return value.item() if hasattr(value, 'item') else value
+
+@cached_read
+def get_products_page(category=None, in_stock_only=False, search=None, sort='name', cursor=None, limit=24):
+    """One page of the catalog using keyset pagination.
+
+    cursor is None for the first page, or the next_cursor returned with the
+    previous page. Pages are read with an index range scan on the sort
+    column instead of OFFSET, so deep pages cost the same as the first.
+
+    Returns (DataFrame, total, next_cursor); total counts every product
+    matching the filters and next_cursor is None on the last page.
+    """
+    try:
+        conn = get_connection()
+        if conn is None:
+            return pd.DataFrame(), 0, None
         
-        # Add product
-        availability = 'In Stock' if stock > 0 else 'Out of Stock'
-        cur.execute("""
-            INSERT INTO product (Brand_ID, Model, Total_Price, Availability, Stock_Qty, Unit_Type, Supplier_ID, Date_Rec)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """, (brand_id, model, price, availability, stock, category, supplier_id, datetime.now().date()))
+        column, direction, field = PRODUCT_SORTS.get(sort, PRODUCT_SORTS['name'])
+        where, params = _product_filters(category, in_stock_only, search)
         
-        conn.commit()
+        cur = conn.cursor()
+        count_sql = "SELECT COUNT(*) FROM product p"
+        if search:
+            count_sql += " LEFT JOIN brand b ON p.Brand_ID = b.Brand_ID"
+        if where:
+            count_sql += " WHERE " + " AND ".join(where)
+        cur.execute(count_sql, params)
+        total = cur.fetchone()[0]
         cur.close()
+        
+        page_where = list(where)
+        page_params = list(params)
+        if cursor is not None:
+            op = '>' if direction == 'ASC' else '<'
+            page_where.append(f"({column} {op} %s OR ({column} = %s AND p.Product_ID {op} %s))")
+            page_params.extend([cursor[0], cursor[0], cursor[1]])
+        query = PRODUCT_SELECT
+        if page_where:
+            query += " WHERE " + " AND ".join(page_where)
+        query += f" ORDER BY {column} {direction}, p.Product_ID {direction} LIMIT %s"
+        # One extra row tells us whether another page follows
+        page_params.append(int(limit) + 1)
+        df = pd.read_sql(query, conn, params=page_params)
         conn.close()
-        return True
+        
+        next_cursor = None
+        if len(df) > limit:
+            df = df.iloc[:limit]
+            last = df.iloc[-1]
+            next_cursor = (_to_python(last[field]), _to_python(last['id']))
+        return df, total, next_cursor
+    except Exception as e:
+        print("❌ get_products_page error:", e)
+        traceback.print_exc()
+        return pd.DataFrame(), 0, None
+
+INVENTORY_COLUMNS = ['category', 'brand', 'product_count', 'total_units', 'stock_value', 'low_stock', 'out_of_stock']
+
+def _adjust_inventory(cur, removed=(), added=()):
+    """Apply product row changes to inventory_aggregates inside the caller's transaction.
+
+    removed and added are (category, brand_id, price, stock, threshold)
+    tuples, as returned by _inventory_rows, for the rows as they were before
+    and after the change; an insert has no removed row, a delete no added
+    row. Deltas are summed per (category, brand) and
+    written with one upsert, in key order so concurrent writers lock the
+    aggregate rows in the same order.
+    """
+    deltas = {}
+    for sign, rows in ((-1, removed), (1, added)):
+        for category, brand_id, price, stock, threshold in rows:
+            stock = int(stock or 0)
+            delta = deltas.setdefault((category or 'Unknown', brand_id or 0), [0, 0, 0.0, 0, 0])
+            delta[0] += sign
+            delta[1] += sign * stock
+            delta[2] += sign * float(price or 0) * stock
+            delta[3] += sign * int(stock < threshold)
+            delta[4] += sign * int(stock <= 0)
+    changes = [(key, delta) for key, delta in sorted(deltas.items()) if any(delta)]
+    if not changes:
+        return
+    cur.execute(f"""
+        INSERT INTO inventory_aggregates
+            (category, brand_id, product_count, total_units, stock_value, low_stock, out_of_stock)
+        VALUES {", ".join(["(%s, %s, %s, %s, %s, %s, %s)"] * len(changes))}
+        ON DUPLICATE KEY UPDATE
+            product_count = product_count + VALUES(product_count),
+            total_units = total_units + VALUES(total_units),
+            stock_value = stock_value + VALUES(stock_value),
+            low_stock = low_stock + VALUES(low_stock),
+            out_of_stock = out_of_stock + VALUES(out_of_stock)
+    """, [value for key, delta in changes for value in key + tuple(delta)])
+
+def _inventory_rows(cur, product_ids):
+    """Lock products and return {Product_ID: (category, brand_id, price, stock, threshold)}"""
+    if not product_ids:
+        return {}
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    cur.execute(f"""
+        SELECT p.Product_ID, p.Unit_Type, p.Brand_ID, p.Total_Price, p.Stock_Qty, {THRESHOLD_SQL}
+        FROM product p
+        {THRESHOLD_JOIN}
+        WHERE p.Product_ID IN ({placeholders})
+        FOR UPDATE OF p
+    """, list(product_ids))
+    return {row[0]: tuple(row[1:]) for row in cur.fetchall()}
+
+def _with_stock(rows, stock_by_product):
+    """Copy _inventory_rows output with new stock levels"""
+    return {pid: (c, b, p, stock_by_product[pid], t) for pid, (c, b, p, _, t) in rows.items()}
+
+def _apply_stock_changes(cur, before, after):
+    """Bring inventory_aggregates and the low-stock alerts in line with a product change.
+
+    before and after map Product_ID to _inventory_rows tuples for the rows
+    the transaction touched, read before and after the change.
+    """
+    _adjust_inventory(cur, before.values(), after.values())
+    _sync_low_stock(cur, before, after)
+
+def _rebuild_inventory_aggregates(cur, category=None):
+    if category is None:
+        cur.execute("DELETE FROM inventory_aggregates")
+    else:
+        cur.execute("DELETE FROM inventory_aggregates WHERE category = %s", (category,))
+    cur.execute(f"""
+        INSERT INTO inventory_aggregates
+            (category, brand_id, product_count, total_units, stock_value, low_stock, out_of_stock)
+        SELECT COALESCE(p.Unit_Type, 'Unknown'), COALESCE(p.Brand_ID, 0), COUNT(*),
+               COALESCE(SUM(p.Stock_Qty), 0), COALESCE(SUM(p.Total_Price * p.Stock_Qty), 0),
+               COALESCE(SUM(p.Stock_Qty < {THRESHOLD_SQL}), 0), COALESCE(SUM(p.Stock_Qty <= 0), 0)
+        FROM product p
+        {THRESHOLD_JOIN}
+        {"WHERE p.Unit_Type = %s" if category is not None else ""}
+        GROUP BY COALESCE(p.Unit_Type, 'Unknown'), COALESCE(p.Brand_ID, 0)
+    """, () if category is None else (category,))
+
+def rebuild_inventory_aggregates():
+    """Recompute inventory_aggregates from the product table"""
+    try:
+        conn = get_connection()
+        if conn is None:
+            return False
+        
+        cur = conn.cursor()
+        _rebuild_inventory_aggregates(cur)
+        conn.commit()
+        invalidate_catalog_cache()
+        cur.close()
+        conn.close()
+        return True
+    except Exception as e:
+        print("❌ rebuild_inventory_aggregates error:", e)
+        traceback.print_exc()
+        return False
+
+@cached_read
+def _read_inventory_aggregates():
+    """Inventory totals per category and brand from inventory_aggregates, or None on failure.
+
+    The table is kept current by the product and purchase write paths, so
+    this reads one row per category/brand pair instead of the catalog.
+    Returns a DataFrame with INVENTORY_COLUMNS.
+    """
+    try:
+        conn = get_connection()
+        if conn is None:
+            return None
+        
+        query = """
+        SELECT a.category, COALESCE(b.Brand_name, 'Unknown') as brand,
+               a.product_count, a.total_units, a.stock_value, a.low_stock, a.out_of_stock
+        FROM inventory_aggregates a
+        LEFT JOIN brand b ON b.Brand_ID = a.brand_id
+        WHERE a.product_count > 0
+        ORDER BY a.category, brand
+        """
+        df = pd.read_sql(query, conn)
+        conn.close()
+        return df
+    except Exception as e:
+        print("❌ get_inventory_aggregates error:", e)
+        traceback.print_exc()
+        return None
+
+def get_inventory_aggregates():
+    """Inventory totals per category and brand (see _read_inventory_aggregates), empty on failure"""
+    df = _read_inventory_aggregates()
+    if df is None:
+        return pd.DataFrame(columns=INVENTORY_COLUMNS)
+    return df
+
+def get_inventory_totals(category=None, search=None):
+    """Product count, units, stock value and low-stock count for the inventory header.
+
+    Without a search term this sums inventory_aggregates; searches aggregate
+    over the products search_products would list for the same term.
+    """
+    if not search:
+        df = get_inventory_aggregates()
+        if category:
+            df = df[df['category'] == category]
+        return {'total_products': int(df['product_count'].sum()),
+                'total_units': int(df['total_units'].sum()),
+                'stock_value': float(df['stock_value'].sum()),
+                'low_stock': int(df['low_stock'].sum()),
+                'out_of_stock': int(df['out_of_stock'].sum())}
+    return _search_inventory_totals(category, search)
+
+@cached_read
+def get_inventory_summary():
+    """Catalog-wide product, unit, low-stock and out-of-stock counts, or None on failure"""
+    try:
+        conn = get_connection()
+        if conn is None:
+            return None
+        
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT COALESCE(SUM(product_count), 0), COALESCE(SUM(total_units), 0),
+                   COALESCE(SUM(low_stock), 0), COALESCE(SUM(out_of_stock), 0)
+            FROM inventory_aggregates
+        """)
+        total_products, total_units, low_stock, out_of_stock = (int(value) for value in cur.fetchone())
+        cur.close()
+        conn.close()
+        return {'total_products': total_products, 'total_units': total_units,
+                'low_stock': low_stock, 'out_of_stock': out_of_stock}
+    except Exception as e:
+        print("❌ get_inventory_summary error:", e)
+        traceback.print_exc()
+        return None
+
+def add_product(brand_name, model, price, category, stock, supplier_id):
+    try:
+        conn = get_connection()
+        if conn is None:
+            return False
+        
+        cur = conn.cursor()
+        
+        # First, get or create brand
+        cur.execute("SELECT Brand_ID FROM brand WHERE Brand_name = %s", (brand_name,))
+        result = cur.fetchone()
+        if result:
+            brand_id = result[0]
+        else:
+            cur.execute("INSERT INTO brand (Brand_name, Date_Rec) VALUES (%s, %s)", 
+                       (brand_name, datetime.now().date()))
+            brand_id = cur.lastrowid
+        
+        # Add product
+        availability = 'In Stock' if stock > 0 else 'Out of Stock'
+        cur.execute("""
+            INSERT INTO product (Brand_ID, Model, Total_Price, Availability, Stock_Qty, Unit_Type, Supplier_ID, Date_Rec)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """, (brand_id, model, price, availability, stock, category, supplier_id, datetime.now().date()))
+        _adjust_product_count(cur, 1)
+        _apply_stock_changes(cur, {}, _inventory_rows(cur, [cur.lastrowid]))
+        
+        conn.commit()
+        invalidate_catalog_cache()
+        _product_set_changed()
+        record_activity('product_added', f"New product added: {brand_name} {model}")
+        cur.close()
+        conn.close()
+        return True
+    except Exception as e:
+        print("❌ add_product error:", e)
+        traceback.print_exc()
+        return False
+
+def update_product_stock_qty(product_id, new_qty):
+    try:
+        conn = get_connection()
+        cur = conn.cursor()
+        cur.execute("SELECT Model FROM product WHERE Product_ID = %s", (product_id,))
+        row = cur.fetchone()
+        old = _inventory_rows(cur, [product_id])
+        availability = 'In Stock' if new_qty > 0 else 'Out of Stock'
+        cur.execute("UPDATE product SET Stock_Qty = %s, Availability = %s WHERE Product_ID = %s", 
+                   (new_qty, availability, product_id))
+        _apply_stock_changes(cur, old, _with_stock(old, {product_id: new_qty}))
+        conn.commit()
+        invalidate_catalog_cache()
+        if row:
+            record_activity('stock_updated', f"Stock updated for {row[0]} ({new_qty} in stock)")
+        cur.close()
+        conn.close()
+        return True
+    except Exception as e:
+        print("❌ update_product_stock_qty error:", e)
+        traceback.print_exc()
+        return False
+
+def update_stock_bulk(stock_by_product, batch_size=500):
+    """Set stock for many products in one transaction.
+
+    stock_by_product maps Product_ID to the new stock quantity. Rows are
+    updated with one CASE statement per batch_size products and committed
+    together. Returns (success, message).
+    """
+    try:
+        updates = [(int(pid), int(qty)) for pid, qty in stock_by_product.items()]
+        if not updates:
+            return True, "No stock changes to save"
+        if any(qty < 0 for _, qty in updates):
+            return False, "Stock quantities cannot be negative"
+        conn = get_connection()
+        if conn is None:
+            return False, "Database connection failed"
+        
+        cur = conn.cursor()
+        old = {}
+        for start in range(0, len(updates), batch_size):
+            batch = updates[start:start + batch_size]
+            old.update(_inventory_rows(cur, [pid for pid, _ in batch]))
+            cases = " ".join(["WHEN %s THEN %s"] * len(batch))
+            placeholders = ", ".join(["%s"] * len(batch))
+            params = [value for pair in batch for value in pair] + [pid for pid, _ in batch]
+            # MySQL applies SET assignments left to right, so Availability sees the new Stock_Qty
+            cur.execute(f"""
+                UPDATE product
+                SET Stock_Qty = CASE Product_ID {cases} END,
+                    Availability = IF(Stock_Qty > 0, 'In Stock', 'Out of Stock')
+                WHERE Product_ID IN ({placeholders})
+            """, params)
+        new_stock = dict(updates)
+        _apply_stock_changes(cur, old, _with_stock(old, new_stock))
+        conn.commit()
+        invalidate_catalog_cache()
+        record_activity('stock_updated', f"Stock updated for {len(updates)} product(s)")
+        cur.close()
+        conn.close()
+        return True, f"Updated stock for {len(updates)} product(s)"
+    except Exception as e:
+        print("❌ update_stock_bulk error:", e)
+        traceback.print_exc()
+        return False, f"Stock update failed: {str(e)}"
+
+def delete_product(product_id):
+    try:
+        conn = get_connection()
+        cur = conn.cursor()
+        old = _inventory_rows(cur, [product_id])
+        cur.execute("DELETE FROM product WHERE Product_ID = %s", (product_id,))
+        _adjust_product_count(cur, -cur.rowcount)
+        _apply_stock_changes(cur, old, {})
+        conn.commit()
+        invalidate_catalog_cache()
+        _product_set_changed()
+        cur.close()
+        conn.close()
+        return True
+    except Exception as e:
+        print("❌ delete_product error:", e)
+        traceback.print_exc()
+        return False
+
+# ==================================================
+# Low-stock alerts
+# ==================================================
+# low_stock_alerts holds exactly the products below their reorder threshold
+# and low_stock_events records every crossing, so alert pages read a list as
+# long as the number of alerts rather than scanning the catalog.
+LOW_STOCK_COLUMNS = ['id', 'name', 'brand', 'category', 'price', 'stock', 'threshold', 'since', 'suggested_qty']
+LOW_STOCK_WRITE_BATCH = 1000
+
+def _category_thresholds(cur):
+    cur.execute("SELECT category, threshold FROM reorder_thresholds")
+    return dict(cur.fetchall())
+
+def _write_low_stock_changes(cur, raised, kept, cleared):
+    """Store alert changes; each list holds (product_id, stock, threshold).
+
+    raised products are newly below threshold, kept ones still are (their
+    stock is refreshed), cleared ones are back above it or deleted. raised
+    and cleared products also get a low_stock_events row.
+    """
+    now = datetime.now()
+    upserts = sorted(raised + kept)
+    for start in range(0, len(upserts), LOW_STOCK_WRITE_BATCH):
+        batch = upserts[start:start + LOW_STOCK_WRITE_BATCH]
+        cur.execute(f"""
+            INSERT INTO low_stock_alerts (product_id, stock, threshold, since)
+            VALUES {", ".join(["(%s, %s, %s, %s)"] * len(batch))}
+            ON DUPLICATE KEY UPDATE stock = VALUES(stock), threshold = VALUES(threshold)
+        """, [value for row in batch for value in row + (now,)])
+    cleared = sorted(cleared)
+    for start in range(0, len(cleared), LOW_STOCK_WRITE_BATCH):
+        batch = cleared[start:start + LOW_STOCK_WRITE_BATCH]
+        cur.execute(f"DELETE FROM low_stock_alerts WHERE product_id IN ({', '.join(['%s'] * len(batch))})",
+                    [pid for pid, _, _ in batch])
+    events = ([(now, pid, 'low', stock, threshold) for pid, stock, threshold in raised]
+              + [(now, pid, 'cleared', stock, threshold) for pid, stock, threshold in cleared])
+    if events:
+        cur.executemany("""
+            INSERT INTO low_stock_events (created_at, product_id, event_type, stock, threshold)
+            VALUES (%s, %s, %s, %s, %s)
+        """, events)
+
+def _sync_low_stock(cur, before, after):
+    """Update alerts for products changed in this transaction (see _apply_stock_changes)"""
+    raised, kept, cleared = [], [], []
+    for pid in set(before) | set(after):
+        old, new = before.get(pid), after.get(pid)
+        was_low = old is not None and old[3] < old[4]
+        is_low = new is not None and new[3] < new[4]
+        if is_low:
+            (kept if was_low else raised).append((pid, new[3], new[4]))
+        elif was_low:
+            cleared.append((pid, new[3] if new else None, (new or old)[4]))
+    if raised or kept or cleared:
+        _write_low_stock_changes(cur, raised, kept, cleared)
+
+def _sync_new_low_stock(cur, first_id):
+    """Raise alerts for low products inserted from first_id on that have none yet.
+
+    Used after bulk inserts, where the individual new ids are not returned.
+    """
+    cur.execute(f"""
+        SELECT p.Product_ID, p.Stock_Qty, {THRESHOLD_SQL}
+        FROM product p
+        {THRESHOLD_JOIN}
+        LEFT JOIN low_stock_alerts a ON a.product_id = p.Product_ID
+        WHERE p.Product_ID >= %s AND a.product_id IS NULL AND p.Stock_Qty < {THRESHOLD_SQL}
+        FOR UPDATE OF p
+    """, (first_id,))
+    raised = cur.fetchall()
+    if raised:
+        _write_low_stock_changes(cur, [tuple(row) for row in raised], [], [])
+
+def _refresh_low_stock(cur, category=None):
+    """Recompute alerts from the product table, for one category or all products"""
+    where = "WHERE p.Unit_Type = %s" if category is not None else ""
+    cur.execute(f"""
+        SELECT p.Product_ID, p.Stock_Qty, {THRESHOLD_SQL}, a.product_id IS NOT NULL
+        FROM product p
+        {THRESHOLD_JOIN}
+        LEFT JOIN low_stock_alerts a ON a.product_id = p.Product_ID
+        {where}
+        FOR UPDATE OF p
+    """, () if category is None else (category,))
+    raised, kept, cleared = [], [], []
+    for pid, stock, threshold, alerted in cur.fetchall():
+        if stock < threshold:
+            (kept if alerted else raised).append((pid, stock, threshold))
+        elif alerted:
+            cleared.append((pid, stock, threshold))
+    if category is None:
+        # Alerts left behind by products deleted outside the app
+        cur.execute("""
+            SELECT a.product_id, NULL, a.threshold
+            FROM low_stock_alerts a
+            LEFT JOIN product p ON p.Product_ID = a.product_id
+            WHERE p.Product_ID IS NULL
+        """)
+        cleared.extend(tuple(row) for row in cur.fetchall())
+    _write_low_stock_changes(cur, raised, kept, cleared)
+
+def rebuild_low_stock_alerts():
+    """Recompute low_stock_alerts from the product table, logging any crossings found"""
+    try:
+        conn = get_connection()
+        if conn is None:
+            return False
+        
+        cur = conn.cursor()
+        _refresh_low_stock(cur)
+        conn.commit()
+        invalidate_catalog_cache()
+        cur.close()
+        conn.close()
+        return True
+    except Exception as e:
+        print("❌ rebuild_low_stock_alerts error:", e)
+        traceback.print_exc()
+        return False
+
+def set_reorder_level(product_id, level):
+    """Set a product's own reorder threshold; None falls back to its category's.
+
+    Returns False if the product does not exist.
+    """
+    try:
+        conn = get_connection()
+        if conn is None:
+            return False
+        
+        cur = conn.cursor()
+        before = _inventory_rows(cur, [product_id])
+        if not before:
+            # rowcount would not help: an unchanged level also reports 0 rows
+            conn.rollback()
+            cur.close()
+            conn.close()
+            return False
+        cur.execute("UPDATE product SET Reorder_Level = %s WHERE Product_ID = %s", (level, product_id))
+        _apply_stock_changes(cur, before, _inventory_rows(cur, [product_id]))
+        conn.commit()
+        invalidate_catalog_cache()
+        cur.close()
+        conn.close()
+        return True
+    except Exception as e:
+        print("❌ set_reorder_level error:", e)
+        traceback.print_exc()
+        return False
+
+def set_category_threshold(category, threshold):
+    """Set the reorder threshold for a category; None falls back to LOW_STOCK_THRESHOLD.
+
+    Re-evaluates the category's products, so this costs a pass over the
+    category; it is meant for occasional admin changes.
+    """
+    try:
+        conn = get_connection()
+        if conn is None:
+            return False
+        
+        cur = conn.cursor()
+        if threshold is None:
+            cur.execute("DELETE FROM reorder_thresholds WHERE category = %s", (category,))
+        else:
+            cur.execute("""
+                INSERT INTO reorder_thresholds (category, threshold) VALUES (%s, %s)
+                ON DUPLICATE KEY UPDATE threshold = VALUES(threshold)
+            """, (category, threshold))
+        _refresh_low_stock(cur, category)
+        _rebuild_inventory_aggregates(cur, category)
+        conn.commit()
+        invalidate_catalog_cache()
+        cur.close()
+        conn.close()
+        return True
+    except Exception as e:
+        print("❌ set_category_threshold error:", e)
+        traceback.print_exc()
+        return False
+
+@cached_read
+def get_reorder_thresholds():
+    try:
+        conn = get_connection()
+        if conn is None:
+            return pd.DataFrame(columns=['category', 'threshold'])
+        
+        df = pd.read_sql("SELECT category, threshold FROM reorder_thresholds ORDER BY category", conn)
+        conn.close()
+        return df
+    except Exception as e:
+        print("❌ get_reorder_thresholds error:", e)
+        traceback.print_exc()
+        return pd.DataFrame(columns=['category', 'threshold'])
+
+@cached_read
+def get_low_stock_items(limit=None, category=None):
+    """Products currently below their reorder threshold, lowest stock first.
+
+    Read from low_stock_alerts, so the cost follows the number of alerts.
+    suggested_qty comes from the last replenishment plan (None if the
+    product was not planned). Returns a DataFrame with LOW_STOCK_COLUMNS.
+    """
+    try:
+        conn = get_connection()
+        if conn is None:
+            return pd.DataFrame(columns=LOW_STOCK_COLUMNS)
+        
+        query = """
+        SELECT a.product_id AS id, p.Model AS name, b.Brand_name AS brand, p.Unit_Type AS category,
+               p.Total_Price AS price, a.stock, a.threshold, a.since, r.suggested_qty
+        FROM low_stock_alerts a
+        JOIN product p ON p.Product_ID = a.product_id
+        LEFT JOIN brand b ON p.Brand_ID = b.Brand_ID
+        LEFT JOIN replenishment_plan r ON r.product_id = a.product_id
+        """
+        params = []
+        if category:
+            query += " WHERE p.Unit_Type = %s"
+            params.append(category)
+        query += " ORDER BY a.stock, a.product_id"
+        if limit:
+            query += " LIMIT %s"
+            params.append(int(limit))
+        df = pd.read_sql(query, conn, params=params)
+        conn.close()
+        return df
+    except Exception as e:
+        print("❌ get_low_stock_items error:", e)
+        traceback.print_exc()
+        return pd.DataFrame(columns=LOW_STOCK_COLUMNS)
+
+def get_low_stock_changes(after_id=0, limit=100):
+    """Threshold crossings logged after event id after_id, oldest first.
+
+    Each dict has id, product_id, name, event ('low' or 'cleared'), stock,
+    threshold and time. Keep the last id seen and pass it back to receive
+    only newer crossings.
+    """
+    try:
+        conn = get_connection()
+        if conn is None:
+            return []
+        
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT e.id, e.product_id, p.Model, e.event_type, e.stock, e.threshold, e.created_at
+            FROM low_stock_events e
+            LEFT JOIN product p ON p.Product_ID = e.product_id
+            WHERE e.id > %s
+            ORDER BY e.id
+            LIMIT %s
+        """, (after_id, int(limit)))
+        rows = cur.fetchall()
+        cur.close()
+        conn.close()
+        return [{'id': event_id, 'product_id': product_id, 'name': name, 'event': event,
+                 'stock': stock, 'threshold': threshold, 'time': created_at}
+                for event_id, product_id, name, event, stock, threshold, created_at in rows]
+    except Exception as e:
+        print("❌ get_low_stock_changes error:", e)
+        traceback.print_exc()
+        return []
+
+def get_low_stock_cursor():
+    """Id of the newest low-stock event, to start following changes from now"""
+    try:
+        conn = get_connection()
+        if conn is None:
+            return 0
+        
+        cur = conn.cursor()
+        cur.execute("SELECT COALESCE(MAX(id), 0) FROM low_stock_events")
+        cursor = cur.fetchone()[0]
+        cur.close()
+        conn.close()
+        return cursor
+    except Exception as e:
+        print("❌ get_low_stock_cursor error:", e)
+        traceback.print_exc()
+        return 0
+
+# ==================================================
+# Replenishment planning
+# ==================================================
+REPLENISHMENT_CONFIG = {
+    'history_days': int(os.environ.get('STOCKFLOW_PLAN_HISTORY_DAYS', '90')),
+    'lead_time_days': float(os.environ.get('STOCKFLOW_PLAN_LEAD_TIME_DAYS', '7')),
+    'cover_days': float(os.environ.get('STOCKFLOW_PLAN_COVER_DAYS', '30')),
+    # z-score of the service level: 1.65 keeps stockouts during lead time to about 5%
+    'service_z': float(os.environ.get('STOCKFLOW_PLAN_SERVICE_Z', '1.65'))
+}
+
+PLAN_COLUMNS = ['product_id', 'demand_rate', 'demand_std', 'lead_time_forecast', 'safety_stock',
+                'reorder_point', 'suggested_qty', 'computed_at']
+PLAN_CHUNK_SIZE = 200000
+PLAN_WRITE_BATCH = 5000
+
+def compute_replenishment(products, daily_sales, history_days, lead_time_days, cover_days, service_z):
+    """Reorder figures for every product at once.
+
+    products has id and stock columns. daily_sales yields DataFrames of
+    (product_id, units) with one row per product and day that had sales;
+    days without sales count as zero demand. Daily mean and standard
+    deviation come from running sums of units and units squared, so the
+    history is never held in memory as a whole.
+
+    Returns a DataFrame indexed like products with demand_rate, demand_std,
+    lead_time_forecast, safety_stock, reorder_point and suggested_qty.
+    Products at or below their reorder point get an order that lifts them
+    to reorder point plus cover_days of demand.
+    """
+    ids = pd.Index(products['id'])
+    total = np.zeros(len(ids))
+    total_sq = np.zeros(len(ids))
+    for chunk in daily_sales:
+        positions = ids.get_indexer(chunk['product_id'])
+        known = positions >= 0
+        units = chunk['units'].to_numpy(dtype=float)[known]
+        total += np.bincount(positions[known], weights=units, minlength=len(ids))
+        total_sq += np.bincount(positions[known], weights=units * units, minlength=len(ids))
+    
+    rate = total / history_days
+    std = np.sqrt(np.maximum(total_sq / history_days - rate * rate, 0))
+    forecast = rate * lead_time_days
+    safety = service_z * std * np.sqrt(lead_time_days)
+    reorder_point = np.ceil(forecast + safety)
+    stock = products['stock'].to_numpy(dtype=float)
+    order_up_to = reorder_point + rate * cover_days
+    suggested = np.where((rate > 0) & (stock <= reorder_point), np.ceil(order_up_to - stock), 0)
+    return pd.DataFrame({
+        'demand_rate': rate,
+        'demand_std': std,
+        'lead_time_forecast': forecast,
+        'safety_stock': safety,
+        'reorder_point': reorder_point.astype(int),
+        'suggested_qty': np.maximum(suggested, 0).astype(int)
+    }, index=products.index)
+
+def plan_replenishment(history_days=None, lead_time_days=None, cover_days=None, service_z=None):
+    """Recompute replenishment_plan for all products from recent purchases.
+
+    Arguments default to REPLENISHMENT_CONFIG. Only products with demand in
+    the history window are stored. Returns a summary dict (products planned,
+    products to reorder, seconds) or None on failure.
+    """
+    config = dict(REPLENISHMENT_CONFIG)
+    for key, value in (('history_days', history_days), ('lead_time_days', lead_time_days),
+                       ('cover_days', cover_days), ('service_z', service_z)):
+        if value is not None:
+            config[key] = value
+    started = time.perf_counter()
+    try:
+        conn = get_connection()
+        if conn is None:
+            return None
+        
+        products = pd.read_sql("SELECT Product_ID AS id, Stock_Qty AS stock FROM product", conn)
+        since = datetime.now().date() - timedelta(days=config['history_days'])
+        daily_sales = pd.read_sql("""
+            SELECT product_id, SUM(quantity) AS units
+            FROM purchases
+            WHERE purchase_date >= %s
+            GROUP BY product_id, DATE(purchase_date)
+        """, conn, params=(since,), chunksize=PLAN_CHUNK_SIZE)
+        plan = compute_replenishment(products, daily_sales, **config)
+        plan.insert(0, 'product_id', products['id'])
+        plan = plan[plan['demand_rate'] > 0]
+        
+        now = datetime.now()
+        rows = [row + [now] for row in plan.astype(object).values.tolist()]
+        cur = conn.cursor()
+        cur.execute("DELETE FROM replenishment_plan")
+        insert_sql = f"""
+            INSERT INTO replenishment_plan ({", ".join(PLAN_COLUMNS)})
+            VALUES ({", ".join(["%s"] * len(PLAN_COLUMNS))})
+        """
+        for start in range(0, len(rows), PLAN_WRITE_BATCH):
+            cur.executemany(insert_sql, rows[start:start + PLAN_WRITE_BATCH])
+        conn.commit()
+        invalidate_catalog_cache()
+        cur.close()
+        conn.close()
+        return {'products': len(plan), 'to_reorder': int((plan['suggested_qty'] > 0).sum()),
+                'seconds': time.perf_counter() - started}
+    except Exception as e:
+        print("❌ plan_replenishment error:", e)
+        traceback.print_exc()
+        return None
+
+@cached_read
+def get_replenishment_plan(limit=50):
+    """Products the last plan says to reorder, most urgent (fewest days of cover) first"""
+    try:
+        conn = get_connection()
+        if conn is None:
+            return pd.DataFrame()
+        
+        query = """
+        SELECT p.Product_ID AS id, p.Model AS name, b.Brand_name AS brand, p.Stock_Qty AS stock,
+               r.demand_rate, r.reorder_point, r.suggested_qty, r.computed_at
+        FROM replenishment_plan r
+        JOIN product p ON p.Product_ID = r.product_id
+        LEFT JOIN brand b ON p.Brand_ID = b.Brand_ID
+        WHERE r.suggested_qty > 0
+        ORDER BY p.Stock_Qty / r.demand_rate, r.product_id
+        LIMIT %s
+        """
+        df = pd.read_sql(query, conn, params=(int(limit),))
+        conn.close()
+        return df
+    except Exception as e:
+        print("❌ get_replenishment_plan error:", e)
+        traceback.print_exc()
+        return pd.DataFrame()
+
+# ==================================================
+# Product Search
+# ==================================================
+# 'auto' uses the FULLTEXT indexes and falls back to the in-process index
+# when they are missing; 'fulltext' and 'memory' force one or the other.
+SEARCH_BACKEND = os.environ.get('STOCKFLOW_SEARCH_BACKEND', 'auto')
+_fulltext_available = SEARCH_BACKEND != 'memory'
+
+def _search_tokens(text):
+    return re.findall(r"[a-z0-9]+", str(text).lower())
+
+# Question words that never name a product when resolving chat/voice messages
+RESOLVER_STOPWORDS = frozenset("""
+    a an and any about are available can check cost costs could do does for give
+    have how in is it its many me much my of on our please price prices show stock
+    tell that the there this to units us we what whats with you your
+""".split())
+# Prefix expansions considered per message token, so short prefixes stay cheap
+RESOLVER_MAX_EXPANSIONS = 20
+# Shorter message tokens only match whole index tokens ("one" must not find "oneplus")
+RESOLVER_MIN_PREFIX = 4
+# Weakest match that still names a product: an exact or prefix hit on a model
+# word, or several weaker hits together. A lone brand or typo'd word is not enough.
+RESOLVER_MIN_SCORE = 1.5
+# ...unless the typo'd model word is the whole message ("price of iphnoe")
+RESOLVER_LONE_MIN_SCORE = 1.0
+
+def _fuzzy_distance(token):
+    """Typos tolerated in a token: none below 4 letters, two from 8"""
+    if len(token) < 4 or not token.isalpha():
+        return 0
+    return 1 if len(token) < 8 else 2
+
+def _deletes(term, distance):
+    """term and every string reachable from it by deleting up to distance letters"""
+    results = {term}
+    frontier = {term}
+    for _ in range(distance):
+        frontier = {word[:i] + word[i + 1:] for word in frontier for i in range(len(word))}
+        results |= frontier
+    return results
+
+def _edit_distance(a, b):
+    """Optimal string alignment distance (adjacent swaps count as one edit)"""
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        previous2, previous = previous, current
+    return previous[len(b)]
+
+class ProductSearchIndex:
+    """In-process inverted index over product model and brand names.
+
+    Used when the database has no FULLTEXT indexes (e.g. a local test
+    database), and by the assistants to resolve product mentions. Query
+    tokens match whole index tokens or their prefixes; a model match
+    scores twice a brand match. A deletion-neighbourhood index maps
+    misspelled tokens to vocabulary terms with hash lookups only.
+    """
+    def __init__(self, products_df):
+        self._categories = dict(zip(products_df['id'], products_df['category']))
+        self._postings = {}
+        self._token_counts = {}
+        for pid, name, brand, category in zip(products_df['id'], products_df['name'],
+                                              products_df['brand'], products_df['category']):
+            name_tokens = set(_search_tokens(name))
+            brand_tokens = set(_search_tokens(brand))
+            for token in name_tokens:
+                self._postings.setdefault(token, {})[pid] = 2
+            for token in brand_tokens:
+                weights = self._postings.setdefault(token, {})
+                weights[pid] = weights.get(pid, 0) + 1
+            self._token_counts[pid] = len(name_tokens | brand_tokens)
+            # Whole-category matches, mirroring the FULLTEXT query's category clause
+            category_key = '#' + str(category).lower()
+            self._postings.setdefault(category_key, {})[pid] = 1
+        self._vocabulary = sorted(t for t in self._postings if not t.startswith('#'))
+        self._deletions = {}
+        for term in self._vocabulary:
+            for variant in _deletes(term, _fuzzy_distance(term)):
+                self._deletions.setdefault(variant, []).append(term)
+
+    def _matches(self, token):
+        """Index tokens equal to or starting with token"""
+        start = bisect.bisect_left(self._vocabulary, token)
+        for term in self._vocabulary[start:]:
+            if not term.startswith(token):
+                break
+            yield term
+
+    def _fuzzy_matches(self, token):
+        """Vocabulary terms within the token's typo allowance, with their distance.
+
+        The first letter must match, so "phone" is not read as a typo of "iphone".
+        """
+        distance = _fuzzy_distance(token)
+        matches = {}
+        if not distance:
+            return matches
+        for variant in _deletes(token, distance):
+            for term in self._deletions.get(variant, ()):
+                if term not in matches and term[0] == token[0] and abs(len(term) - len(token)) <= distance:
+                    found = _edit_distance(token, term)
+                    if found <= distance:
+                        matches[term] = found
+        return matches
+
+    def _resolve_token(self, token):
+        """Vocabulary terms a message token may refer to, weighted by match quality"""
+        if token in self._postings:
+            return {token: 1.0}
+        terms = {}
+        if len(token) >= RESOLVER_MIN_PREFIX:
+            for term in self._matches(token):
+                terms[term] = 0.8
+                if len(terms) >= RESOLVER_MAX_EXPANSIONS:
+                    break
+        if not terms:
+            # Rounded so one typo scores exactly 0.5 (0.7 - 0.2 is 0.4999...)
+            terms = {term: round(0.7 - 0.2 * found, 2)
+                     for term, found in self._fuzzy_matches(token).items()}
+        return terms
+
+    def resolve(self, text, limit=1):
+        """Ids of products named in free text (e.g. a chat message), best match first.
+
+        Question words are ignored; other tokens match exactly, by prefix or
+        within a small edit distance. Products scoring below
+        RESOLVER_MIN_SCORE are not returned; when only one word is left,
+        a model-word match scoring RESOLVER_LONE_MIN_SCORE is enough, so a
+        single typo still resolves. Ties go to the product whose
+        name is covered most completely, so "iphone 15" prefers "iPhone 15"
+        over "iPhone 15 Pro".
+        """
+        scores = {}
+        matched = {}
+        model_hits = set()
+        tokens = set(_search_tokens(text)) - RESOLVER_STOPWORDS
+        for token in tokens:
+            best = {}
+            for term, quality in self._resolve_token(token).items():
+                for pid, weight in self._postings[term].items():
+                    best[pid] = max(best.get(pid, 0), weight * quality)
+                    if weight >= 2:
+                        model_hits.add(pid)
+            for pid, score in best.items():
+                scores[pid] = scores.get(pid, 0) + score
+                matched[pid] = matched.get(pid, 0) + 1
+        
+        candidates = [pid for pid, score in scores.items() if score >= RESOLVER_MIN_SCORE]
+        if not candidates and len(tokens) == 1:
+            candidates = [pid for pid, score in scores.items()
+                          if pid in model_hits and score >= RESOLVER_LONE_MIN_SCORE]
+        ranked = sorted(candidates, key=lambda pid: (-scores[pid],
+                                                     -matched[pid] / max(self._token_counts[pid], 1),
+                                                     pid))
+        return ranked[:limit]
+
+    def search(self, query, limit=20, category=None, offset=0):
+        """Return up to limit (product id, relevance) pairs ranked by relevance, skipping offset
+
+        limit=None returns every match.
+        """
+        scores = {}
+        for token in _search_tokens(query):
+            best = {}
+            for term in self._matches(token):
+                for pid, weight in self._postings[term].items():
+                    best[pid] = max(best.get(pid, 0), weight)
+            for pid, weight in best.items():
+                scores[pid] = scores.get(pid, 0) + weight
+        for pid in self._postings.get('#' + str(query).strip().lower(), {}):
+            scores[pid] = scores.get(pid, 0) + 1
+        
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        if category:
+            ranked = [item for item in ranked if self._categories.get(item[0]) == category]
+        return ranked[offset:] if limit is None else ranked[offset:offset + limit]
+
+# The index only depends on product names, brands and categories, so it is
+# rebuilt when products are added, deleted or imported (or after the TTL, for
+# changes made by other processes), not on every stock change.
+SEARCH_INDEX_TTL = float(os.environ.get('STOCKFLOW_SEARCH_INDEX_TTL', '600'))
+_product_set_version = 0
+_search_index = None  # (product set version, built at, index)
+_search_index_lock = threading.Lock()
+
+def _product_set_changed():
+    """Call after committing product inserts or deletes"""
+    global _product_set_version
+    with _search_index_lock:
+        _product_set_version += 1
+
+def _build_search_index():
+    conn = get_connection()
+    if conn is None:
+        return None
+    try:
+        products = pd.read_sql("""
+            SELECT p.Product_ID as id, p.Model as name,
+                   COALESCE(b.Brand_name, 'Unknown') as brand, p.Unit_Type as category
+            FROM product p
+            LEFT JOIN brand b ON p.Brand_ID = b.Brand_ID
+        """, conn)
+    finally:
+        conn.close()
+    if products.empty:
+        return None
+    return ProductSearchIndex(products)
+
+def get_search_index():
+    """The in-process search index for the current set of products.
+
+    Built by one thread at a time; concurrent callers wait for that build
+    instead of starting their own.
+    """
+    global _search_index
+    cached = _search_index
+    if (cached is not None and cached[0] == _product_set_version
+            and time.monotonic() - cached[1] < SEARCH_INDEX_TTL):
+        return cached[2]
+    with _search_index_lock:
+        cached = _search_index
+        version = _product_set_version
+        if (cached is not None and cached[0] == version
+                and time.monotonic() - cached[1] < SEARCH_INDEX_TTL):
+            return cached[2]
+        index = _build_search_index()
+        if index is not None:
+            _search_index = (version, time.monotonic(), index)
+        return index
+
+def resolve_product_ids(text, limit=1):
+    """Ids of the products mentioned in a chat or voice message, best match first.
+
+    Served from the in-process index, so resolving a message does not scan
+    the catalog.
+    """
+    try:
+        index = get_search_index()
+        if index is None:
+            return []
+        return index.resolve(text, limit)
+    except Exception as e:
+        print("❌ resolve_product_ids error:", e)
+        traceback.print_exc()
+        return []
+
+@cached_read
+def get_products_by_ids(product_ids):
+    """Current rows (PRODUCT_SELECT columns) of the given products, in the given order"""
+    if not product_ids:
+        return pd.DataFrame()
+    try:
+        conn = get_connection()
+        if conn is None:
+            return pd.DataFrame()
+        
+        query = PRODUCT_SELECT + f" WHERE p.Product_ID IN ({', '.join(['%s'] * len(product_ids))})"
+        df = pd.read_sql(query, conn, params=[int(pid) for pid in product_ids])
+        conn.close()
+        order = {pid: i for i, pid in enumerate(product_ids)}
+        df = df.iloc[df['id'].map(order).argsort()].reset_index(drop=True)
+        return df
+    except Exception as e:
+        print("❌ get_products_by_ids error:", e)
+        traceback.print_exc()
+        return pd.DataFrame()
+
+def _fulltext_query(query):
+    """Turn free text into a BOOLEAN MODE query: any word, prefix-matched"""
+    return " ".join(f"{token}*" for token in _search_tokens(query))
+
+def _fulltext_where(query, category):
+    """WHERE clause and params selecting the products a FULLTEXT search matches"""
+    terms = _fulltext_query(query)
+    sql = """
+        WHERE (MATCH(p.Model) AGAINST (%s IN BOOLEAN MODE)
+               OR MATCH(b.Brand_name) AGAINST (%s IN BOOLEAN MODE)
+               OR p.Unit_Type = %s)
+    """
+    params = [terms, terms, query.strip()]
+    if category:
+        sql += " AND p.Unit_Type = %s"
+        params.append(category)
+    return sql, params
+
+@cached_read
+def _search_products_fulltext(query, limit, category, offset=0):
+    conn = get_connection()
+    if conn is None:
+        return pd.DataFrame()
+    
+    terms = _fulltext_query(query)
+    sql = PRODUCT_SELECT.replace("FROM product p", """, (2 * MATCH(p.Model) AGAINST (%s IN BOOLEAN MODE)
+                + COALESCE(MATCH(b.Brand_name) AGAINST (%s IN BOOLEAN MODE), 0)
+                + (p.Unit_Type = %s)) AS relevance
+        FROM product p""", 1)
+    where, where_params = _fulltext_where(query, category)
+    sql += where
+    params = [terms, terms, query.strip()] + where_params
+    sql += " ORDER BY relevance DESC, p.Product_ID LIMIT %s OFFSET %s"
+    params.extend([int(limit), int(offset)])
+    try:
+        df = pd.read_sql(sql, conn, params=params)
+    finally:
+        conn.close()
+    return df
+
+# ER_FT_MATCHING_KEY_NOT_FOUND: "Can't find FULLTEXT index matching the column list"
+FULLTEXT_INDEX_MISSING = 1191
+
+def _mysql_errno(error):
+    """MySQL error number of error, also when pandas wrapped it"""
+    for candidate in (error, error.__cause__):
+        errno = getattr(candidate, 'errno', None)
+        if errno is not None:
+            return errno
+    return None
+
+def search_products(query, limit=20, category=None, offset=0):
+    """Relevance-ranked product search over model and brand names.
+
+    Uses the FULLTEXT indexes on product.Model and brand.Brand_name, so the
+    cost does not grow with a full catalog scan. Databases without those
+    indexes are served from the in-process ProductSearchIndex instead.
+    """
+    global _fulltext_available
+    if not _search_tokens(query):
+        return pd.DataFrame()
+    if _fulltext_available:
+        try:
+            return _search_products_fulltext(query, limit, category, offset)
+        except Exception as e:
+            # Only a missing index switches backends; other errors are transient
+            if SEARCH_BACKEND == 'fulltext' or _mysql_errno(e) != FULLTEXT_INDEX_MISSING:
+                print("❌ search_products error:", e)
+                traceback.print_exc()
+                return pd.DataFrame()
+            print("⚠ FULLTEXT search unavailable, using in-process index:", e)
+            _fulltext_available = False
+    try:
+        index = get_search_index()
+        if index is None:
+            return pd.DataFrame()
+        ranked = index.search(query, limit, category, offset)
+        # The index holds no prices or stock; read the current rows
+        results = get_products_by_ids(tuple(pid for pid, _ in ranked))
+        if results.empty:
+            return results
+        relevance = dict(ranked)
+        results['relevance'] = [relevance[pid] for pid in results['id']]
+        return results
     except Exception as e:
-        print("❌ add_product error:", e)
+        print("❌ search_products error:", e)
         traceback.print_exc()
-        return False
+        return pd.DataFrame()
 
-def update_product_stock_qty(product_id, new_qty):
+SEARCH_TOTALS_SELECT = f"""
+    SELECT COUNT(*), COALESCE(SUM(p.Stock_Qty), 0), COALESCE(SUM(p.Total_Price * p.Stock_Qty), 0),
+           COALESCE(SUM(p.Stock_Qty < {THRESHOLD_SQL}), 0), COALESCE(SUM(p.Stock_Qty <= 0), 0)
+    FROM product p
+    LEFT JOIN brand b ON p.Brand_ID = b.Brand_ID
+    {THRESHOLD_JOIN}
+"""
+
+def _search_totals_sql(query, category):
+    """Totals query over the products search_products matches, or None if it matches nothing"""
+    if _fulltext_available:
+        where, params = _fulltext_where(query, category)
+        return SEARCH_TOTALS_SELECT + where, params
+    index = get_search_index()
+    if index is None:
+        raise RuntimeError("product search index unavailable")
+    product_ids = [pid for pid, _ in index.search(query, None, category)]
+    if not product_ids:
+        return None
+    placeholders = ', '.join(['%s'] * len(product_ids))
+    return SEARCH_TOTALS_SELECT + f" WHERE p.Product_ID IN ({placeholders})", product_ids
+
+@cached_read
+def _search_inventory_totals(category, search):
+    global _fulltext_available
+    empty = {'total_products': 0, 'total_units': 0, 'stock_value': 0, 'low_stock': 0, 'out_of_stock': 0}
+    if not _search_tokens(search):
+        return empty
     try:
         conn = get_connection()
+        if conn is None:
+            return empty
+        
         cur = conn.cursor()
-        availability = 'In Stock' if new_qty > 0 else 'Out of Stock'
-        cur.execute("UPDATE product SET Stock_Qty = %s, Availability = %s WHERE Product_ID = %s", 
-                   (new_qty, availability, product_id))
-        conn.commit()
-        cur.close()
-        conn.close()
-        return True
+        try:
+            try:
+                query = _search_totals_sql(search, category)
+                if query is None:
+                    return empty
+                cur.execute(*query)
+            except Error as e:
+                if not _fulltext_available or SEARCH_BACKEND == 'fulltext' or _mysql_errno(e) != FULLTEXT_INDEX_MISSING:
+                    raise
+                print("⚠ FULLTEXT search unavailable, using in-process index:", e)
+                _fulltext_available = False
+                query = _search_totals_sql(search, category)
+                if query is None:
+                    return empty
+                cur.execute(*query)
+            total_products, total_units, stock_value, low_stock, out_of_stock = cur.fetchone()
+        finally:
+            cur.close()
+            conn.close()
+        return {'total_products': total_products, 'total_units': int(total_units), 'stock_value': stock_value,
+                'low_stock': int(low_stock), 'out_of_stock': int(out_of_stock)}
     except Exception as e:
-        print("❌ update_product_stock_qty error:", e)
+        print("❌ get_inventory_totals error:", e)
         traceback.print_exc()
-        return False
+        return empty
 
-def delete_product(product_id):
+# ==================================================
+# Bulk Product Import
+# ==================================================
+IMPORT_COLUMN_ALIASES = {
+    'brand_name': 'brand',
+    'name': 'model',
+    'product': 'model',
+    'total_price': 'price',
+    'unit_type': 'category',
+    'stock_qty': 'stock',
+    'quantity': 'stock',
+    'supplier': 'supplier_id'
+}
+IMPORT_MAX_ERRORS = 1000
+
+def _read_import_chunks(source, file_format, chunk_size):
+    """Yield DataFrames of at most chunk_size rows from a CSV or Parquet source"""
+    if file_format == 'parquet':
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Parquet import requires pyarrow (pip install pyarrow)")
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    elif file_format == 'csv':
+        yield from pd.read_csv(source, chunksize=chunk_size)
+    else:
+        raise ValueError(f"Unsupported import format: {file_format}")
+
+def _clean_import_chunk(chunk, first_row, default_supplier_id):
+    """Validate one chunk; returns (valid rows DataFrame, [(row, error), ...])"""
+    chunk = chunk.rename(columns=lambda c: str(c).strip().lower())
+    chunk = chunk.rename(columns=IMPORT_COLUMN_ALIASES)
+    chunk.index = range(first_row, first_row + len(chunk))
+    
+    missing = [c for c in ('brand', 'model', 'price', 'category', 'stock') if c not in chunk.columns]
+    if missing:
+        return chunk.iloc[0:0], [(row, f"Missing column(s): {', '.join(missing)}") for row in chunk.index]
+    
+    for col in ('brand', 'model', 'category'):
+        chunk[col] = chunk[col].astype('string').str.strip()
+    chunk['price'] = pd.to_numeric(chunk['price'], errors='coerce')
+    chunk['stock'] = pd.to_numeric(chunk['stock'], errors='coerce')
+    if 'supplier_id' in chunk.columns:
+        chunk['supplier_id'] = pd.to_numeric(chunk['supplier_id'], errors='coerce').fillna(default_supplier_id)
+    else:
+        chunk['supplier_id'] = default_supplier_id
+    
+    checks = [
+        (chunk['brand'].isna() | (chunk['brand'] == ''), "Brand is required"),
+        (chunk['model'].isna() | (chunk['model'] == ''), "Model is required"),
+        (chunk['category'].isna() | (chunk['category'] == ''), "Category is required"),
+        (chunk['price'].isna() | (chunk['price'] < 0), "Price must be a non-negative number"),
+        (chunk['stock'].isna() | (chunk['stock'] < 0) | (chunk['stock'] % 1 != 0),
+         "Stock must be a non-negative whole number")
+    ]
+    invalid = pd.Series(False, index=chunk.index)
+    errors = []
+    for mask, message in checks:
+        mask = mask.fillna(True).astype(bool) & ~invalid
+        errors.extend((row, message) for row in chunk.index[mask])
+        invalid |= mask
+    return chunk[~invalid], sorted(errors)
+
+def _resolve_brand_ids(conn, cur, names, brand_cache):
+    """Map brand names to Brand_ID, creating missing brands in bulk.
+
+    brand_cache is keyed on the case-folded name, matching MySQL's default
+    case-insensitive collation, and is shared across chunks of one import.
+    New brands are committed straight away so that a rolled-back product
+    batch cannot leave ids in the cache that no longer exist.
+    """
+    wanted = {}
+    for name in names:
+        key = name.casefold()
+        if key not in brand_cache:
+            wanted.setdefault(key, name)
+    if not wanted:
+        return
+    
+    def lookup():
+        placeholders = ', '.join(['%s'] * len(wanted))
+        cur.execute(f"SELECT Brand_ID, Brand_name FROM brand WHERE Brand_name IN ({placeholders})",
+                    list(wanted.values()))
+        for brand_id, brand_name in cur.fetchall():
+            brand_cache[brand_name.casefold()] = brand_id
+    
+    lookup()
+    new_brands = [name for key, name in wanted.items() if key not in brand_cache]
+    if new_brands:
+        today = datetime.now().date()
+        cur.executemany("INSERT INTO brand (Brand_name, Date_Rec) VALUES (%s, %s)",
+                        [(name, today) for name in new_brands])
+        conn.commit()
+        lookup()
+
+def _insert_import_rows(conn, cur, rows):
+    """Insert validated rows; returns [(row, error), ...] for rows that failed"""
+    insert_sql = """
+        INSERT INTO product (Brand_ID, Model, Total_Price, Availability, Stock_Qty, Unit_Type, Supplier_ID, Date_Rec)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """
+    try:
+        cur.executemany(insert_sql, [params for _, params in rows])
+        first_id = cur.lastrowid
+        _adjust_product_count(cur, len(rows))
+        # New products have no Reorder_Level, so only category rules apply
+        thresholds = _category_thresholds(cur)
+        _adjust_inventory(cur, added=[(category, brand_id, price, stock, thresholds.get(category, LOW_STOCK_THRESHOLD))
+                                      for _, (brand_id, _, price, _, stock, category, _, _) in rows])
+        _sync_new_low_stock(cur, first_id)
+        conn.commit()
+        return []
+    except Error:
+        conn.rollback()
+    
+    # The batch was rejected (e.g. an unknown supplier); retry row by row to
+    # report exactly which rows are bad and keep the rest.
+    errors = []
+    inserted = []
+    for row, params in rows:
+        try:
+            cur.execute(insert_sql, params)
+            inserted.append(cur.lastrowid)
+        except Error as e:
+            errors.append((row, str(e)))
+    _adjust_product_count(cur, len(inserted))
+    _apply_stock_changes(cur, {}, _inventory_rows(cur, inserted))
+    conn.commit()
+    return errors
+
+def import_products(source, file_format=None, chunk_size=5000, default_supplier_id=1, progress=None):
+    """Stream products from a CSV or Parquet file into the catalog.
+
+    The file is read chunk_size rows at a time; each chunk is validated with
+    pandas, its brands are resolved in one lookup and its products inserted
+    with a single executemany. source may be a path or a file-like object;
+    file_format ('csv' or 'parquet') defaults to the file extension.
+    progress, if given, is called with the running report after each chunk.
+
+    Returns a report dict with rows_read, inserted, failed, errors (a list of
+    (row number, message), capped at IMPORT_MAX_ERRORS), seconds and
+    rows_per_second.
+    """
+    if file_format is None:
+        name = str(getattr(source, 'name', source)).lower()
+        file_format = 'parquet' if name.endswith(('.parquet', '.pq')) else 'csv'
+    report = {'rows_read': 0, 'inserted': 0, 'failed': 0, 'errors': [],
+              'seconds': 0.0, 'rows_per_second': 0.0}
+    started = time.perf_counter()
+    
+    def record_errors(errors):
+        report['failed'] += len(errors)
+        room = IMPORT_MAX_ERRORS - len(report['errors'])
+        report['errors'].extend(errors[:max(room, 0)])
+    
     try:
         conn = get_connection()
+        if conn is None:
+            report['errors'].append((0, "Database connection failed"))
+            return report
+        
         cur = conn.cursor()
-        cur.execute("DELETE FROM product WHERE Product_ID = %s", (product_id,))
-        conn.commit()
+        brand_cache = {}
+        today = datetime.now().date()
+        # Data rows are numbered from 1, matching a spreadsheet view without the header
+        next_row = 1
+        for chunk in _read_import_chunks(source, file_format, chunk_size):
+            first_row, next_row = next_row, next_row + len(chunk)
+            report['rows_read'] += len(chunk)
+            valid, errors = _clean_import_chunk(chunk, first_row, default_supplier_id)
+            record_errors(errors)
+            if not valid.empty:
+                _resolve_brand_ids(conn, cur, valid['brand'].unique(), brand_cache)
+                rows = [
+                    (row, (brand_cache[brand.casefold()], model, float(price),
+                           'In Stock' if stock > 0 else 'Out of Stock', int(stock), category,
+                           int(supplier_id), today))
+                    for row, brand, model, price, stock, category, supplier_id in zip(
+                        valid.index, valid['brand'], valid['model'], valid['price'],
+                        valid['stock'], valid['category'], valid['supplier_id'])
+                ]
+                failed = _insert_import_rows(conn, cur, rows)
+                record_errors(failed)
+                report['inserted'] += len(rows) - len(failed)
+                if len(failed) < len(rows):
+                    invalidate_catalog_cache()
+                    _product_set_changed()
+            
+            report['seconds'] = time.perf_counter() - started
+            report['rows_per_second'] = report['rows_read'] / report['seconds'] if report['seconds'] else 0.0
+            if progress is not None:
+                progress(report)
+        
         cur.close()
         conn.close()
-        return True
     except Exception as e:
-        print("❌ delete_product error:", e)
+        print("❌ import_products error:", e)
         traceback.print_exc()
-        return False
+        record_errors([(report['rows_read'], f"Import stopped: {str(e)}")])
+    
+    report['seconds'] = time.perf_counter() - started
+    report['rows_per_second'] = report['rows_read'] / report['seconds'] if report['seconds'] else 0.0
+    return report
 
 # ==================================================
 # Purchase Management
 # ==================================================
+def _reserve_stock(cur, product_id, quantity):
+    """Take quantity units of a product inside the caller's transaction.
+
+    The decrement only applies while enough stock is left, so concurrent
+    buyers cannot oversell; the row stays locked until commit/rollback.
+    Returns None on success or a message explaining the failure.
+    """
+    # MySQL applies SET assignments left to right, so Availability sees the new Stock_Qty
+    cur.execute("""
+        UPDATE product
+        SET Stock_Qty = Stock_Qty - %s,
+            Availability = IF(Stock_Qty > 0, 'In Stock', 'Out of Stock')
+        WHERE Product_ID = %s AND Stock_Qty >= %s
+    """, (quantity, product_id, quantity))
+    if cur.rowcount == 1:
+        return None
+    
+    cur.execute("SELECT Stock_Qty FROM product WHERE Product_ID = %s", (product_id,))
+    result = cur.fetchone()
+    if result is None:
+        return "Product not found"
+    if result[0] <= 0:
+        return "Product is out of stock"
+    return f"Only {result[0]} left in stock"
+
+def _record_stock_taken(cur, taken):
+    """Update inventory_aggregates for reserved stock; taken maps Product_ID to quantity.
+
+    Call once per transaction after all reservations, so the aggregate rows
+    are locked together and in key order.
+    """
+    rows = _inventory_rows(cur, list(taken))
+    before = _with_stock(rows, {pid: row[3] + taken[pid] for pid, row in rows.items()})
+    _apply_stock_changes(cur, before, rows)
+
 def purchase_product(user_id, product_id, product_name, price, quantity):
+    """Buy a product: reserve stock and record the purchase in one transaction.
+
+    Returns (success, message).
+    """
     try:
+        if quantity <= 0:
+            return False, "Quantity must be at least 1"
         conn = get_connection()
         if conn is None:
-            return False
+            return False, "Database connection failed"
         
         cur = conn.cursor()
         
+        # Reserve stock first so that a failed check leaves nothing to undo
+        error = _reserve_stock(cur, product_id, quantity)
+        if error:
+            conn.rollback()
+            cur.close()
+            conn.close()
+            return False, error
+        
+        new_customer = _is_new_customer(cur, user_id)
+        now = datetime.now()
+        
         # Create purchase record
         cur.execute("""
             INSERT INTO purchases (user_id, product_id, product_name, price, quantity, purchase_date)
             VALUES (%s, %s, %s, %s, %s, %s)
-        """, (user_id, product_id, product_name, price, quantity, datetime.now()))
-        
-        # Update stock
-        cur.execute("SELECT Stock_Qty FROM product WHERE Product_ID = %s", (product_id,))
-        result = cur.fetchone()
-        if result:
-            current_stock = result[0]
-            new_stock = current_stock - quantity
-            if new_stock < 0:
-                conn.rollback()
-                return False
-            update_product_stock_qty(product_id, new_stock)
+        """, (user_id, product_id, product_name, price, quantity, now))
+        order_id = cur.lastrowid
+        sale_lines = [(product_id, float(price) * quantity, quantity)]
+        _record_daily_sales(cur, now.date(), sale_lines)
+        _record_product_sales(cur, now, sale_lines)
+        _record_stock_taken(cur, {product_id: quantity})
+        _record_sale_metrics(cur, 1, float(price) * quantity, int(new_customer))
         
         conn.commit()
+        invalidate_catalog_cache()
+        record_activity('purchase', f"New order #{order_id}: {quantity} × {product_name}", user_id)
         cur.close()
         conn.close()
-        return True
+        return True, f"Successfully purchased {product_name}!"
     except Exception as e:
         print("❌ purchase_product error:", e)
         traceback.print_exc()
-        return False
+        return False, f"Purchase failed: {str(e)}"
+
+def checkout(user_id, items, allow_partial=True):
+    """Buy several cart lines in one transaction.
+
+    items is a list of dicts with product_id, product_name, price and
+    quantity. Stock is reserved for every line, all purchase rows are
+    written with one bulk insert and the transaction is committed once.
+    With allow_partial=False, any line that cannot be filled cancels the
+    whole order.
+
+    Returns (success, message, results) where results holds one dict per
+    line with product_id, product_name, quantity, success and message.
+    """
+    # Merge repeated products so that each row is locked and decremented once
+    lines = {}
+    for item in items:
+        product_id = int(item['product_id'])
+        if product_id in lines:
+            lines[product_id]['quantity'] += int(item['quantity'])
+        else:
+            lines[product_id] = {
+                'product_id': product_id,
+                'product_name': item['product_name'],
+                'price': item['price'],
+                'quantity': int(item['quantity'])
+            }
+    if not lines:
+        return False, "Cart is empty", []
+    
+    # Lock rows in a fixed order so concurrent checkouts cannot deadlock
+    results = [dict(line, success=False, message="") for _, line in sorted(lines.items())]
+    try:
+        conn = get_connection()
+        if conn is None:
+            for line in results:
+                line['message'] = "Database connection failed"
+            return False, "Database connection failed", results
+        
+        cur = conn.cursor()
+        for line in results:
+            if line['quantity'] <= 0:
+                line['message'] = "Quantity must be at least 1"
+                continue
+            error = _reserve_stock(cur, line['product_id'], line['quantity'])
+            line['success'] = error is None
+            line['message'] = error or "Reserved"
+        
+        filled = [line for line in results if line['success']]
+        if not filled or (not allow_partial and len(filled) < len(results)):
+            conn.rollback()
+            cur.close()
+            conn.close()
+            for line in filled:
+                line['success'] = False
+                line['message'] = "Cancelled: other items in the order are unavailable"
+            return False, "No items could be purchased" if not filled else "Order cancelled", results
+        
+        new_customer = _is_new_customer(cur, user_id)
+        now = datetime.now()
+        cur.executemany("""
+            INSERT INTO purchases (user_id, product_id, product_name, price, quantity, purchase_date)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, [(user_id, line['product_id'], line['product_name'], line['price'], line['quantity'], now)
+              for line in filled])
+        sale_lines = [(line['product_id'], float(line['price']) * line['quantity'], line['quantity'])
+                      for line in filled]
+        _record_daily_sales(cur, now.date(), sale_lines)
+        _record_product_sales(cur, now, sale_lines)
+        _record_stock_taken(cur, {line['product_id']: line['quantity'] for line in filled})
+        _record_sale_metrics(cur, len(filled), sum(float(line['price']) * line['quantity'] for line in filled),
+                             int(new_customer))
+        
+        conn.commit()
+        invalidate_catalog_cache()
+        record_activity('purchase', f"New order: {sum(line['quantity'] for line in filled)} item(s), "
+                                    f"₹{sum(float(line['price']) * line['quantity'] for line in filled):,.0f}", user_id)
+        cur.close()
+        conn.close()
+        for line in filled:
+            line['message'] = "Purchased"
+        if len(filled) == len(results):
+            return True, f"Purchased {len(filled)} item(s)", results
+        return True, f"Purchased {len(filled)} of {len(results)} items", results
+    except Exception as e:
+        print("❌ checkout error:", e)
+        traceback.print_exc()
+        for line in results:
+            line['success'] = False
+            line['message'] = "Checkout failed"
+        return False, f"Checkout failed: {str(e)}", results
 
-def get_purchase_history(user_id):
+def get_purchase_history(user_id, limit=None):
     try:
         conn = get_connection()
         if conn is None:
@@ -391,7 +2837,11 @@ def get_purchase_history(user_id):
         WHERE user_id = %s 
         ORDER BY purchase_date DESC
         """
-        df = pd.read_sql(query, conn, params=[user_id])
+        params = [user_id]
+        if limit is not None:
+            query += " LIMIT %s"
+            params.append(int(limit))
+        df = pd.read_sql(query, conn, params=params)
         conn.close()
         return df
     except Exception as e:
@@ -416,6 +2866,72 @@ def get_all_purchases():
         print("❌ get_all_purchases error:", e)
         return pd.DataFrame()
 
+CUSTOMER_SPEND_SORTS = {
+    'id': 'u.id',
+    'username': 'u.username',
+    'total_spent': 'total_spent DESC, u.id',
+    'last_purchase': 'last_purchase DESC, u.id'
+}
+
+def get_customer_spend(search=None, role=None, user_ids=None, sort='id', limit=None, offset=0):
+    """Per-user total spend, order count and last purchase date.
+
+    Aggregates purchases for every matching non-admin user in one grouped
+    query. Returns (DataFrame, total) where total is the number of users
+    matching the filters, for paging with limit/offset.
+    """
+    empty = pd.DataFrame(columns=['user_id', 'username', 'role', 'created_at',
+                                  'total_spent', 'order_count', 'last_purchase'])
+    try:
+        if user_ids is not None and len(user_ids) == 0:
+            return empty, 0
+        conn = get_connection()
+        if conn is None:
+            return empty, 0
+        
+        where = ["u.role != 'admin'"]
+        params = []
+        if role:
+            where.append("u.role = %s")
+            params.append(role)
+        if search:
+            where.append("u.username LIKE %s")
+            params.append(f"%{search}%")
+        if user_ids is not None:
+            where.append(f"u.id IN ({', '.join(['%s'] * len(user_ids))})")
+            params.extend(int(uid) for uid in user_ids)
+        where_sql = " AND ".join(where)
+        
+        cur = conn.cursor()
+        cur.execute(f"SELECT COUNT(*) FROM users u WHERE {where_sql}", params)
+        total = cur.fetchone()[0]
+        cur.close()
+        
+        query = f"""
+        SELECT u.id AS user_id,
+               u.username,
+               u.role,
+               u.created_at,
+               COALESCE(SUM(p.price * p.quantity), 0) AS total_spent,
+               COUNT(p.user_id) AS order_count,
+               MAX(p.purchase_date) AS last_purchase
+        FROM users u
+        LEFT JOIN purchases p ON p.user_id = u.id
+        WHERE {where_sql}
+        GROUP BY u.id, u.username, u.role, u.created_at
+        ORDER BY {CUSTOMER_SPEND_SORTS.get(sort, 'u.id')}
+        """
+        if limit is not None:
+            query += " LIMIT %s OFFSET %s"
+            params = params + [int(limit), int(offset)]
+        df = pd.read_sql(query, conn, params=params)
+        conn.close()
+        return df, total
+    except Exception as e:
+        print("❌ get_customer_spend error:", e)
+        traceback.print_exc()
+        return empty, 0
+
 def delete_order(order_id):
     try:
         # For demo - in real app, you'd delete from orders table
@@ -483,6 +2999,23 @@ def remove_favorite(user_id, product_id):
         traceback.print_exc()
         return False
 
+def get_favorite_ids(user_id):
+    """Return the set of product ids the user has favorited, in one query"""
+    try:
+        conn = get_connection()
+        if conn is None:
+            return set()
+        
+        cur = conn.cursor()
+        cur.execute("SELECT product_id FROM favorites WHERE user_id = %s", (user_id,))
+        favorite_ids = {row[0] for row in cur.fetchall()}
+        cur.close()
+        conn.close()
+        return favorite_ids
+    except Exception as e:
+        print("❌ get_favorite_ids error:", e)
+        return set()
+
 def is_favorite(user_id, product_id):
     try:
         conn = get_connection()
@@ -529,6 +3062,7 @@ def send_message(sender, message):
         cur = conn.cursor()
         cur.execute("INSERT INTO messages (sender, message) VALUES (%s, %s)", (sender, message))
         conn.commit()
+        record_activity('message', f"Message from {sender}")
         cur.close()
         conn.close()
         return True
@@ -568,6 +3102,125 @@ def clear_messages():
         traceback.print_exc()
         return False
 
+# ==================================================
+# ASSISTANT INTENTS
+# ==================================================
+# Intents shared by the chat and voice assistants, highest priority first:
+# (name, keywords matched as whole words, extra regex patterns)
+ASSISTANT_INTENTS = [
+    ('low_stock', (), (r"\blow(?:er|est)?\b.*\b(?:stocks?|stocked|inventory|inventories|available)\b",
+                       r"\b(?:stocks?|inventory|inventories)\b.*\blow(?:er|est)?\b")),
+    ('stock', ('stock', 'stocks', 'stocked', 'inventory', 'inventories', 'available', 'availability'), ()),
+    ('price', ('price', 'prices', 'priced', 'pricing', 'cost', 'costs', 'how much'), ()),
+    ('sales', ('order', 'orders', 'ordered', 'sale', 'sales', 'revenue', 'revenues',
+               'purchase', 'purchases', 'purchased'), ()),
+    ('help', ('help', 'what can you do', 'command', 'commands', 'assistant'), ()),
+    ('greeting', ('hello', 'hi', 'hey', 'greetings'), ()),
+    ('thanks', ('thank', 'thanks', 'thx'), ()),
+    ('goodbye', ('bye', 'goodbye', 'exit'), ()),
+]
+
+ASSISTANT_UNAVAILABLE = "Sorry, I can't reach the store data right now. Please try again in a moment."
+
+class IntentRouter:
+    """Classifies a message into one registered intent and runs its handler.
+
+    Every intent's keywords and patterns are compiled into one regex with a
+    named group per intent, so a message is classified in a single scan
+    however many intents are registered. When several intents match, the
+    one registered first wins.
+
+    With a cache, answers are stored under (namespace, intent, entities,
+    role, user) in the cache's current data version; user is only part of
+    the key for per_user intents. Handlers are called as
+    handler(message, user_role, user_id, *entities) and return None when
+    the data they need could not be read; that is answered with
+    ASSISTANT_UNAVAILABLE and never cached.
+    """
+    def __init__(self, fallback, cache=None, namespace=None):
+        self.fallback = fallback
+        self.cache = cache
+        self.namespace = namespace
+        self._handlers = {}
+        self._sources = []
+        self._priority = {}
+        self._pattern = None
+
+    def register(self, name, handler, keywords=(), patterns=(), entities=None, per_user=False):
+        """Add an intent; keywords match whole words, spaces match any whitespace.
+
+        entities maps a message to the tuple of values its answer depends on.
+        """
+        alternatives = [r"\b" + r"\s+".join(map(re.escape, keyword.split())) + r"\b"
+                        for keyword in keywords]
+        alternatives.extend(patterns)
+        if not alternatives:
+            raise ValueError(f"Intent {name!r} needs keywords or patterns")
+        self._priority[name] = len(self._sources)
+        self._sources.append(f"(?P<{name}>{'|'.join(alternatives)})")
+        self._handlers[name] = (handler, entities, per_user)
+        self._pattern = None
+
+    def classify(self, message):
+        """The highest-priority intent found in message, or None"""
+        if self._pattern is None:
+            self._pattern = re.compile("|".join(self._sources), re.IGNORECASE)
+        best = None
+        for match in self._pattern.finditer(str(message)):
+            priority = self._priority[match.lastgroup]
+            if best is None or priority < self._priority[best]:
+                best = match.lastgroup
+                if priority == 0:
+                    break
+        return best
+
+    def dispatch(self, message, user_role, user_id=None):
+        """Run the handler of message's intent (or the fallback) and return its reply"""
+        intent = self.classify(message)
+        if intent is None:
+            return self.fallback(message, user_role, user_id)
+        handler, extract, per_user = self._handlers[intent]
+        entities = extract(message) if extract else ()
+        if self.cache is None:
+            response = handler(message, user_role, user_id, *entities)
+        else:
+            # None results are not stored, so a degraded answer is retried next time
+            key = (self.namespace, intent, entities, user_role, user_id if per_user else None)
+            response = self.cache.get_or_load(key, lambda: handler(message, user_role, user_id, *entities))
+        return ASSISTANT_UNAVAILABLE if response is None else response
+
+def _price_entities(message):
+    """The product a price question names, as resolved by the search index"""
+    product_ids = resolve_product_ids(message)
+    return (int(product_ids[0]) if product_ids else None,)
+
+# What an intent's answer depends on in the message text; passed to its handler
+INTENT_ENTITIES = {'price': _price_entities}
+# Intents whose answer depends on the user asking, not just their role
+USER_SCOPED_INTENTS = {'sales'}
+
+# Answers to repeated questions, shared by all sessions. invalidate_catalog_cache()
+# bumps it together with the catalog cache, so answers follow every data change.
+response_cache = VersionedCache(
+    ttl=CACHE_CONFIG['ttl'],
+    max_entries=int(os.environ.get('STOCKFLOW_RESPONSE_CACHE_MAX_ENTRIES', '1024')))
+
+def get_response_cache_stats():
+    stats = response_cache.stats()
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+    return stats
+
+def build_intent_router(handlers, fallback, namespace):
+    """An IntentRouter for the ASSISTANT_INTENTS that have a handler"""
+    router = IntentRouter(fallback, cache=response_cache, namespace=namespace)
+    for name, keywords, patterns in ASSISTANT_INTENTS:
+        if name in handlers:
+            router.register(name, handlers[name], keywords, patterns,
+                            entities=INTENT_ENTITIES.get(name),
+                            per_user=name in USER_SCOPED_INTENTS)
+    return router
+
 # ==================================================
 # VOICE ASSISTANT FEATURE
 # ==================================================
@@ -583,6 +3236,14 @@ class VoiceAssistant:
                 self.engine.setProperty('voice', voices[1].id)  # Female voice if available
         except Exception as e:
             print("❌ Voice assistant initialization error:", e)
+        self.router = build_intent_router({
+            'low_stock': self._low_stock,
+            'stock': self._stock,
+            'price': self._price,
+            'sales': self._sales,
+            'help': self._help,
+            'greeting': self._greeting,
+        }, fallback=self._unknown, namespace='voice')
     
     def speak(self, text):
         """Convert text to speech"""
@@ -612,59 +3273,56 @@ class VoiceAssistant:
             print("❌ Speech recognition error:", e)
             return "error"
     
-    def process_voice_command(self, command, products_df, user_role):
+    def process_voice_command(self, command, user_role, user_id=None):
         """Process voice commands and return response"""
-        command = command.lower()
-        response = ""
-        
-        if any(word in command for word in ['stock', 'inventory', 'available']):
-            # Stock enquiry
-            if 'low' in command:
-                low_stock = products_df[products_df['stock'] < 10]
-                count = len(low_stock)
-                if count > 0:
-                    product_names = ", ".join(low_stock['name'].head(3).tolist())
-                    response = f"You have {count} products with low stock. Including: {product_names}"
-                else:
-                    response = "No products are low on stock. All items are sufficiently stocked."
-            else:
-                total_stock = products_df['stock'].sum()
-                total_products = len(products_df)
-                out_of_stock = len(products_df[products_df['stock'] == 0])
-                response = f"You have {total_products} products with total {total_stock} items in stock. {out_of_stock} products are out of stock."
-                
-        elif any(word in command for word in ['price', 'cost', 'how much']):
-            # Price enquiry
-            for product in ['iphone', 'samsung', 'macbook', 'tv', 'camera', 'laptop']:
-                if product in command:
-                    matching = products_df[products_df['name'].str.contains(product, case=False, na=False)]
-                    if not matching.empty:
-                        price = matching.iloc[0]['price']
-                        name = matching.iloc[0]['name']
-                        stock = matching.iloc[0]['stock']
-                        response = f"{name} costs ₹{price:,.0f}. There are {stock} units in stock."
-                        break
-            if not response:
-                response = "Please specify which product price you want to know. For example: 'What is the price of iPhone?'"
-                
-        elif any(word in command for word in ['order', 'sales', 'revenue']):
-            # Sales enquiry
-            if user_role in ['admin', 'employee']:
-                metrics = get_dashboard_metrics()
-                response = f"Total revenue is ₹{metrics['revenue']:,.0f} from {metrics['total_orders']} orders. You have {metrics['active_customers']} active customers."
-            else:
-                response = "Sales information is available for administrators and employees only."
-                
-        elif any(word in command for word in ['help', 'what can you do', 'assistant']):
-            response = "I can help you check stock levels, product prices, sales information, and more. Try asking me about stock, prices, orders, or sales data!"
-            
-        elif any(word in command for word in ['hello', 'hi', 'hey']):
-            response = "Hello! I'm your StockFlow assistant. How can I help you today?"
-            
-        else:
-            response = "I'm not sure I understand. Try asking me about stock levels, product prices, or sales information. Say 'help' for more options."
-            
-        return response
+        return self.router.dispatch(command.lower(), user_role, user_id)
+    
+    def _low_stock(self, command, user_role, user_id):
+        totals = get_inventory_summary()
+        if totals is None:
+            return None
+        count = totals['low_stock']
+        if count > 0:
+            low_stock = get_low_stock_items(limit=3)
+            if low_stock.empty:
+                return None
+            product_names = ", ".join(low_stock['name'].tolist())
+            return f"You have {count} products with low stock. Including: {product_names}"
+        return "No products are low on stock. All items are sufficiently stocked."
+    
+    def _stock(self, command, user_role, user_id):
+        totals = get_inventory_summary()
+        if totals is None:
+            return None
+        return f"You have {totals['total_products']} products with total {totals['total_units']} items in stock. {totals['out_of_stock']} products are out of stock."
+    
+    def _price(self, command, user_role, user_id, product_id):
+        if product_id is not None:
+            product = get_product(product_id)
+            if product is None:
+                return None
+            price = product['price']
+            name = product['name']
+            stock = product['stock']
+            return f"{name} costs ₹{price:,.0f}. There are {stock} units in stock."
+        return "Please specify which product price you want to know. For example: 'What is the price of iPhone?'"
+    
+    def _sales(self, command, user_role, user_id):
+        if user_role in ['admin', 'employee']:
+            metrics = _read_dashboard_metrics()
+            if metrics is None:
+                return None
+            return f"Total revenue is ₹{metrics['revenue']:,.0f} from {metrics['total_orders']} orders. You have {metrics['active_customers']} active customers."
+        return "Sales information is available for administrators and employees only."
+    
+    def _help(self, command, user_role, user_id):
+        return "I can help you check stock levels, product prices, sales information, and more. Try asking me about stock, prices, orders, or sales data!"
+    
+    def _greeting(self, command, user_role, user_id):
+        return "Hello! I'm your StockFlow assistant. How can I help you today?"
+    
+    def _unknown(self, command, user_role, user_id):
+        return "I'm not sure I understand. Try asking me about stock levels, product prices, or sales information. Say 'help' for more options."
 
 # Global voice assistant instance
 voice_assistant = VoiceAssistant()
@@ -672,82 +3330,301 @@ voice_assistant = VoiceAssistant()
 # ==================================================
 # CHAT ASSISTANT FEATURE
 # ==================================================
+CHAT_CONFIG = {
+    'window': int(os.environ.get('STOCKFLOW_CHAT_WINDOW', '20')),
+    'page_size': int(os.environ.get('STOCKFLOW_CHAT_PAGE_SIZE', '20')),
+    'max_loaded': int(os.environ.get('STOCKFLOW_CHAT_MAX_LOADED', '100')),
+    'batch_size': int(os.environ.get('STOCKFLOW_CHAT_BATCH_SIZE', '200')),
+    'flush_interval': float(os.environ.get('STOCKFLOW_CHAT_FLUSH_INTERVAL', '1'))
+}
+# chat_messages.message is TEXT (64 KB); a longer row would fail its whole batch
+CHAT_MESSAGE_MAX_CHARS = 16000
+
+def _write_chat_messages(rows):
+    conn = get_connection()
+    if conn is None:
+        return False
+    
+    cur = conn.cursor()
+    cur.executemany("""
+        INSERT INTO chat_messages (conversation_id, message_key, created_at, role, message)
+        VALUES (%s, %s, %s, %s, %s)
+    """, rows)
+    conn.commit()
+    cur.close()
+    conn.close()
+    return True
+
+def _chat_message(key, created_at, role, message):
+    return {"key": key, "role": role, "message": message, "timestamp": created_at}
+
+class ConversationStore:
+    """Chat conversations persisted in chat_conversations / chat_messages.
+
+    Each user has a current conversation (their newest one). Messages are
+    queued on a WriteBehindBuffer and written in batches, so any replica
+    can resume a conversation a second or so after it was written. The
+    database's AUTO_INCREMENT id orders a conversation, so sessions on
+    several replicas never clash; each message also carries a unique key
+    its session generated, which locates it as a paging cursor.
+    """
+    def __init__(self, window=20, page_size=20, max_loaded=100, batch_size=200, flush_interval=1.0):
+        self.window = window
+        self.page_size = page_size
+        self.max_loaded = max_loaded
+        self._writes = WriteBehindBuffer('chat_messages', _write_chat_messages,
+                                         batch_size=batch_size, flush_interval=flush_interval)
+
+    def latest_conversation(self, user_id):
+        """The user's newest conversation id, or None"""
+        try:
+            conn = get_connection()
+            if conn is None:
+                return None
+            cur = conn.cursor()
+            cur.execute("SELECT MAX(id) FROM chat_conversations WHERE user_id = %s", (user_id,))
+            conversation_id = cur.fetchone()[0]
+            cur.close()
+            conn.close()
+            return conversation_id
+        except Exception as e:
+            print("❌ latest_conversation error:", e)
+            traceback.print_exc()
+            return None
+
+    def start_conversation(self, user_id):
+        """Open a new conversation for the user; returns its id or None"""
+        try:
+            conn = get_connection()
+            if conn is None:
+                return None
+            cur = conn.cursor()
+            cur.execute("INSERT INTO chat_conversations (user_id, started_at) VALUES (%s, %s)",
+                        (user_id, datetime.now()))
+            conversation_id = cur.lastrowid
+            conn.commit()
+            cur.close()
+            conn.close()
+            return conversation_id
+        except Exception as e:
+            print("❌ start_conversation error:", e)
+            traceback.print_exc()
+            return None
+
+    def append(self, conversation_id, entry):
+        self._writes.add((conversation_id, entry['key'], entry['timestamp'], entry['role'], entry['message']))
+
+    def load_page(self, conversation_id, before_key=None, limit=None):
+        """Up to limit messages written before the message before_key, oldest first.
+
+        Returns (messages, has_more). Pending messages of this process are
+        flushed first, so a session resuming here sees what it just wrote
+        and its own messages can serve as cursors.
+        """
+        limit = limit or self.page_size
+        try:
+            self._writes.flush()
+            conn = get_connection()
+            if conn is None:
+                return [], False
+            
+            query = """
+                SELECT message_key, created_at, role, message FROM chat_messages
+                WHERE conversation_id = %s
+            """
+            params = [conversation_id]
+            if before_key is not None:
+                query += " AND id < (SELECT id FROM chat_messages WHERE message_key = %s)"
+                params.append(before_key)
+            query += " ORDER BY id DESC LIMIT %s"
+            # One extra row tells us whether older messages remain
+            params.append(int(limit) + 1)
+            cur = conn.cursor()
+            cur.execute(query, params)
+            rows = cur.fetchall()
+            cur.close()
+            conn.close()
+            messages = [_chat_message(*row) for row in reversed(rows[:limit])]
+            return messages, len(rows) > limit
+        except Exception as e:
+            print("❌ load_page error:", e)
+            traceback.print_exc()
+            return [], False
+
+    def stats(self):
+        return self._writes.stats()
+
+conversation_store = ConversationStore(**CHAT_CONFIG)
+
+class Conversation:
+    """One session's view of a user's conversation.
+
+    Only the newest store.window messages are held in a ring buffer;
+    older ones stay in the database until load_earlier() pages them in,
+    at most store.max_loaded of them, and they are dropped again when a new
+    message arrives. Nothing is read until the history is first needed.
+    Without a user id (or a database) the conversation is kept in memory
+    only.
+    """
+    def __init__(self, store, user_id=None):
+        self.store = store
+        self.user_id = user_id
+        self.conversation_id = None
+        self.messages = deque(maxlen=store.window)
+        self.earlier = []
+        self.has_earlier = False
+        self._loaded = user_id is None
+
+    def load(self):
+        """Resume the user's newest conversation from the database, once"""
+        if self._loaded:
+            return
+        self._loaded = True
+        self.conversation_id = self.store.latest_conversation(self.user_id)
+        if self.conversation_id is None:
+            return
+        messages, self.has_earlier = self.store.load_page(self.conversation_id, limit=self.store.window)
+        self.messages.extend(messages)
+
+    def history(self):
+        self.load()
+        return self.earlier + list(self.messages)
+
+    def can_load_earlier(self):
+        self.load()
+        return (self.has_earlier and self.conversation_id is not None
+                and len(self.earlier) < self.store.max_loaded)
+
+    def append(self, role, message):
+        self.load()
+        if self.conversation_id is None and self.user_id is not None:
+            self.conversation_id = self.store.start_conversation(self.user_id)
+        # Back to the newest messages only; paged-in history can be loaded again
+        if self.earlier or len(self.messages) == self.messages.maxlen:
+            self.earlier = []
+            self.has_earlier = True
+        entry = _chat_message(uuid.uuid4().hex, datetime.now(), role, message[:CHAT_MESSAGE_MAX_CHARS])
+        self.messages.append(entry)
+        if self.conversation_id is not None:
+            self.store.append(self.conversation_id, entry)
+
+    def load_earlier(self):
+        """Page the next older messages in; returns how many were added"""
+        if not self.can_load_earlier():
+            return 0
+        oldest = self.earlier[0] if self.earlier else self.messages[0]
+        limit = min(self.store.page_size, self.store.max_loaded - len(self.earlier))
+        messages, self.has_earlier = self.store.load_page(self.conversation_id, before_key=oldest['key'],
+                                                          limit=limit)
+        self.earlier[:0] = messages
+        return len(messages)
+
+    def clear(self):
+        """Start over; the old conversation stays in the database"""
+        self._loaded = True
+        self.conversation_id = None
+        self.messages.clear()
+        self.earlier = []
+        self.has_earlier = False
+        if self.user_id is not None:
+            self.conversation_id = self.store.start_conversation(self.user_id)
+
 class ChatAssistant:
-    def __init__(self):
-        self.conversation_history = []
+    def __init__(self, user_id=None, store=None):
+        self.conversation = Conversation(store or conversation_store, user_id)
+        self.router = build_intent_router({
+            'low_stock': self._low_stock,
+            'stock': self._stock,
+            'price': self._price,
+            'sales': self._sales,
+            'help': self._help,
+            'greeting': self._greeting,
+            'thanks': self._thanks,
+            'goodbye': self._goodbye,
+        }, fallback=self._unknown, namespace='chat')
     
-    def get_response(self, message, products_df, user_role, user_id=None):
+    def get_response(self, message, user_role, user_id=None):
         """Process chat message and return response"""
-        message_lower = message.lower()
-        response = ""
-        
         # Add user message to history
-        self.conversation_history.append({"role": "user", "message": message, "timestamp": datetime.now()})
+        self.conversation.append("user", message)
         
         # Process the message
-        if any(word in message_lower for word in ['stock', 'inventory', 'available']):
-            if 'low' in message_lower:
-                low_stock = products_df[products_df['stock'] < 10]
-                count = len(low_stock)
-                if count > 0:
-                    product_list = "\n".join([f"• {row['name']} ({row['stock']} left)" for _, row in low_stock.head(5).iterrows()])
-                    response = f"**Low Stock Alert!**\n\nYou have {count} products with low stock:\n\n{product_list}"
-                    if count > 5:
-                        response += f"\n\n... and {count - 5} more products."
-                else:
-                    response = "✅ All products are sufficiently stocked! No low stock items."
-            else:
-                total_stock = products_df['stock'].sum()
-                total_products = len(products_df)
-                out_of_stock = len(products_df[products_df['stock'] == 0])
-                in_stock = len(products_df[products_df['stock'] > 0])
-                
-                response = f"**Inventory Summary:**\n\n• **Total Products:** {total_products}\n• **Total Stock Quantity:** {total_stock}\n• **In Stock Products:** {in_stock}\n• **Out of Stock Products:** {out_of_stock}"
-                
-        elif any(word in message_lower for word in ['price', 'cost', 'how much']):
-            product_found = False
-            for product in ['iphone', 'samsung', 'macbook', 'tv', 'camera', 'laptop', 'galaxy', 'thinkpad', 'rog', 'sony', 'canon']:
-                if product in message_lower:
-                    matching = products_df[products_df['name'].str.contains(product, case=False, na=False)]
-                    if not matching.empty:
-                        product_info = matching.iloc[0]
-                        price = product_info['price']
-                        name = product_info['name']
-                        stock = product_info['stock']
-                        brand = product_info['brand']
-                        category = product_info['category']
-                        
-                        stock_status = "✅ In Stock" if stock > 10 else "⚠️ Low Stock" if stock > 0 else "❌ Out of Stock"
-                        
-                        response = f"**{name}**\n\n• **Brand:** {brand}\n• **Category:** {category}\n• **Price:** ₹{price:,.0f}\n• **Stock:** {stock} units\n• **Status:** {stock_status}"
-                        product_found = True
-                        break
+        response = self.router.dispatch(message, user_role, user_id)
+
+        # Add assistant response to history
+        self.conversation.append("assistant", response)
             
-            if not product_found:
-                # Show all products if no specific product mentioned
-                top_products = products_df.head(5)
-                product_list = "\n".join([f"• {row['name']} - ₹{row['price']:,.0f}" for _, row in top_products.iterrows()])
-                response = f"**Available Products:**\n\n{product_list}\n\n*Ask about a specific product for more details!*"
-                
-        elif any(word in message_lower for word in ['order', 'sales', 'revenue', 'purchase']):
-            if user_role in ['admin', 'employee']:
-                metrics = get_dashboard_metrics()
-                response = f"**Sales Dashboard:**\n\n• **Total Revenue:** ₹{metrics['revenue']:,.0f}\n• **Total Orders:** {metrics['total_orders']}\n• **Active Customers:** {metrics['active_customers']}\n• **Total Products:** {metrics['total_products']}"
-            else:
-                # For customers, show their purchase history
-                if user_id:
-                    purchases = get_purchase_history(user_id)
-                    if not purchases.empty:
-                        total_spent = (purchases['price'] * purchases['quantity']).sum()
-                        purchase_list = "\n".join([f"• {row['product_name']} - ₹{row['price']:,.0f} x {row['quantity']}" for _, row in purchases.head(5).iterrows()])
-                        response = f"**Your Purchase History:**\n\n{purchase_list}\n\n**Total Spent:** ₹{total_spent:,.0f}"
-                    else:
-                        response = "You haven't made any purchases yet. Browse our products to get started!"
-                else:
-                    response = "Sales information is available for administrators and employees only."
-                    
-        elif any(word in message_lower for word in ['help', 'what can you do', 'commands']):
-            response = """**I can help you with:**
+        return response
+    
+    def _low_stock(self, message, user_role, user_id):
+        totals = get_inventory_summary()
+        if totals is None:
+            return None
+        count = totals['low_stock']
+        if count > 0:
+            low_stock = get_low_stock_items(limit=5)
+            if low_stock.empty:
+                return None
+            product_list = "\n".join([f"• {row['name']} ({row['stock']} left)" for _, row in low_stock.iterrows()])
+            response = f"**Low Stock Alert!**\n\nYou have {count} products with low stock:\n\n{product_list}"
+            if count > 5:
+                response += f"\n\n... and {count - 5} more products."
+            return response
+        return "✅ All products are sufficiently stocked! No low stock items."
+    
+    def _stock(self, message, user_role, user_id):
+        totals = get_inventory_summary()
+        if totals is None:
+            return None
+        in_stock = totals['total_products'] - totals['out_of_stock']
+        
+        return f"**Inventory Summary:**\n\n• **Total Products:** {totals['total_products']}\n• **Total Stock Quantity:** {totals['total_units']}\n• **In Stock Products:** {in_stock}\n• **Out of Stock Products:** {totals['out_of_stock']}"
+    
+    def _price(self, message, user_role, user_id, product_id):
+        if product_id is not None:
+            product_info = get_product(product_id)
+            if product_info is None:
+                return None
+            price = product_info['price']
+            name = product_info['name']
+            stock = product_info['stock']
+            brand = product_info['brand']
+            category = product_info['category']
+            
+            stock_status = "✅ In Stock" if stock >= product_info['reorder_level'] else "⚠️ Low Stock" if stock > 0 else "❌ Out of Stock"
+            
+            return f"**{name}**\n\n• **Brand:** {brand}\n• **Category:** {category}\n• **Price:** ₹{price:,.0f}\n• **Stock:** {stock} units\n• **Status:** {stock_status}"
+        
+        # Show all products if no specific product mentioned
+        top_products, _, _ = get_products_page(limit=5)
+        if top_products.empty:
+            return None
+        product_list = "\n".join([f"• {row['name']} - ₹{row['price']:,.0f}" for _, row in top_products.iterrows()])
+        return f"**Available Products:**\n\n{product_list}\n\n*Ask about a specific product for more details!*"
+    
+    def _sales(self, message, user_role, user_id):
+        if user_role in ['admin', 'employee']:
+            metrics = _read_dashboard_metrics()
+            if metrics is None:
+                return None
+            return f"**Sales Dashboard:**\n\n• **Total Revenue:** ₹{metrics['revenue']:,.0f}\n• **Total Orders:** {metrics['total_orders']}\n• **Active Customers:** {metrics['active_customers']}\n• **Total Products:** {metrics['total_products']}"
+        # For customers, show their purchase history
+        if user_id:
+            spend, _ = get_customer_spend(user_ids=[user_id])
+            if spend.empty:
+                return None
+            if spend['order_count'].iloc[0] > 0:
+                purchases = get_purchase_history(user_id, limit=5)
+                if purchases.empty:
+                    return None
+                total_spent = spend['total_spent'].iloc[0]
+                purchase_list = "\n".join([f"• {row['product_name']} - ₹{row['price']:,.0f} x {row['quantity']}" for _, row in purchases.iterrows()])
+                return f"**Your Purchase History:**\n\n{purchase_list}\n\n**Total Spent:** ₹{total_spent:,.0f}"
+            return "You haven't made any purchases yet. Browse our products to get started!"
+        return "Sales information is available for administrators and employees only."
+    
+    def _help(self, message, user_role, user_id):
+        return """**I can help you with:**
 
 • **Stock Information** - Ask about current stock levels, low stock items
 • **Product Prices** - Inquire about specific product prices and details  
@@ -760,36 +3637,256 @@ class ChatAssistant:
 - *"What's the price of iPhone?"*  
 - *"How are our sales?"*
 - *"My purchase history"*"""
-
-        elif any(word in message_lower for word in ['hello', 'hi', 'hey', 'greetings']):
-            response = f"Hello! 👋 I'm your StockFlow Assistant. I can help you with stock information, product prices, sales data, and more. How can I assist you today?"
-
-        elif any(word in message_lower for word in ['thank', 'thanks']):
-            response = "You're welcome! 😊 Is there anything else I can help you with?"
-
-        elif any(word in message_lower for word in ['bye', 'goodbye', 'exit']):
-            response = "Goodbye! 👋 Feel free to reach out if you need any more assistance."
-
-        else:
-            response = "I'm not sure I understand. I can help you with stock information, product prices, sales data, and more. Try asking about our products or say **help** to see what I can do!"
-
-        # Add assistant response to history
-        self.conversation_history.append({"role": "assistant", "message": response, "timestamp": datetime.now()})
-        
-        # Keep only last 20 messages to prevent memory issues
-        if len(self.conversation_history) > 20:
-            self.conversation_history = self.conversation_history[-20:]
-            
-        return response
+    
+    def _greeting(self, message, user_role, user_id):
+        return f"Hello! 👋 I'm your StockFlow Assistant. I can help you with stock information, product prices, sales data, and more. How can I assist you today?"
+    
+    def _thanks(self, message, user_role, user_id):
+        return "You're welcome! 😊 Is there anything else I can help you with?"
+    
+    def _goodbye(self, message, user_role, user_id):
+        return "Goodbye! 👋 Feel free to reach out if you need any more assistance."
+    
+    def _unknown(self, message, user_role, user_id):
+        return "I'm not sure I understand. I can help you with stock information, product prices, sales data, and more. Try asking about our products or say **help** to see what I can do!"
     
     def get_conversation_history(self):
         """Return the conversation history"""
-        return self.conversation_history
+        return self.conversation.history()
+    
+    def has_earlier_messages(self):
+        return self.conversation.can_load_earlier()
+    
+    def load_earlier_messages(self):
+        """Page older messages into the history; returns how many were loaded"""
+        return self.conversation.load_earlier()
     
     def clear_history(self):
         """Clear conversation history"""
-        self.conversation_history = []
+        self.conversation.clear()
         return "Conversation history cleared!"
 
 # Global chat assistant instance
-chat_assistant = ChatAssistant()
\ No newline at end of file
+chat_assistant = ChatAssistant()
+
+# ==================================================
+# Report export
+# ==================================================
+REPORT_DIR = os.environ.get('STOCKFLOW_REPORT_DIR', 'reports')
+REPORT_CHUNK_SIZE = 50000
+
+# name -> (query, date column for start/end filters or None, ORDER BY clause);
+# every ORDER BY follows an index so rows stream without a filesort
+REPORT_QUERIES = {
+    'orders': ("""
+        SELECT pu.purchase_date, pu.user_id, u.username, pu.product_id, pu.product_name,
+               pu.price, pu.quantity, pu.price * pu.quantity AS total
+        FROM purchases pu
+        LEFT JOIN users u ON u.id = pu.user_id
+    """, "pu.purchase_date", "ORDER BY pu.purchase_date"),
+    'inventory': (f"""
+        SELECT p.Product_ID AS id, p.Model AS name, b.Brand_name AS brand, p.Unit_Type AS category,
+               p.Total_Price AS price, p.Stock_Qty AS stock, {THRESHOLD_SQL} AS reorder_level,
+               p.Total_Price * p.Stock_Qty AS stock_value
+        FROM product p
+        LEFT JOIN brand b ON p.Brand_ID = b.Brand_ID
+        {THRESHOLD_JOIN}
+    """, None, "ORDER BY p.Product_ID"),
+    'sales': ("""
+        SELECT r.sale_date, r.category, COALESCE(b.Brand_name, 'Unknown') AS brand,
+               r.revenue, r.units, r.orders
+        FROM sales_daily r
+        LEFT JOIN brand b ON b.Brand_ID = r.brand_id
+    """, "r.sale_date", "ORDER BY r.sale_date, r.category, r.brand_id")
+}
+
+def _decimals_to_float(df):
+    for column in df.columns:
+        if df[column].dtype == object:
+            first = df[column].dropna()
+            if not first.empty and isinstance(first.iloc[0], decimal.Decimal):
+                df[column] = df[column].astype(float)
+    return df
+
+def stream_report(report, start=None, end=None, chunk_size=REPORT_CHUNK_SIZE):
+    """Yield a REPORT_QUERIES report as DataFrames of at most chunk_size rows.
+
+    Rows are read with an unbuffered cursor and fetchmany, so memory use is
+    bounded by one chunk however large the table is. start/end (dates,
+    inclusive) filter reports that have a date column.
+    """
+    query, date_column, order = REPORT_QUERIES[report]
+    params = []
+    where = []
+    if date_column and start:
+        where.append(f"{date_column} >= %s")
+        params.append(start)
+    if date_column and end:
+        where.append(f"{date_column} < %s")
+        params.append(end + timedelta(days=1))
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    query += " " + order
+    
+    conn = get_connection()
+    if conn is None:
+        raise ConnectionError("Database connection failed")
+    try:
+        cur = conn.cursor(buffered=False)
+        cur.execute(query, params)
+        columns = [column[0] for column in cur.description]
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield _decimals_to_float(pd.DataFrame(rows, columns=columns))
+        cur.close()
+    finally:
+        # A consumer that stops early leaves unread rows; the pool then
+        # discards the connection instead of reusing it.
+        conn.close()
+
+def export_report(report, destination=None, file_format='csv', start=None, end=None,
+                  chunk_size=REPORT_CHUNK_SIZE, progress=None):
+    """Write a report to CSV or Parquet one chunk at a time.
+
+    destination is a file path or a directory (default REPORT_DIR), where
+    a timestamped file name is chosen. progress, if given, is called with
+    the number of rows written after each chunk. Parquet needs pyarrow.
+    Returns a dict with report, path, rows and seconds, or None on failure.
+    """
+    started = time.perf_counter()
+    destination = destination or REPORT_DIR
+    try:
+        if report not in REPORT_QUERIES:
+            raise ValueError(f"Unknown report: {report}")
+        if file_format not in ('csv', 'parquet'):
+            raise ValueError(f"Unsupported report format: {file_format}")
+        if os.path.isdir(destination) or destination == REPORT_DIR:
+            os.makedirs(destination, exist_ok=True)
+            path = os.path.join(destination, f"{report}_{datetime.now():%Y%m%d_%H%M%S}.{file_format}")
+        else:
+            path = destination
+        
+        rows = 0
+        chunks = stream_report(report, start, end, chunk_size)
+        if file_format == 'csv':
+            with open(path, 'w', newline='', encoding='utf-8') as out:
+                for chunk in chunks:
+                    chunk.to_csv(out, header=rows == 0, index=False)
+                    rows += len(chunk)
+                    if progress:
+                        progress(rows)
+        else:
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise ValueError("Parquet export requires pyarrow (pip install pyarrow)")
+            writer = None
+            try:
+                for chunk in chunks:
+                    table = pa.Table.from_pandas(chunk, preserve_index=False)
+                    if writer is None:
+                        writer = pq.ParquetWriter(path, table.schema)
+                    else:
+                        # Later chunks may infer other types (e.g. all-null columns)
+                        table = table.cast(writer.schema)
+                    writer.write_table(table)
+                    rows += len(chunk)
+                    if progress:
+                        progress(rows)
+            finally:
+                if writer is not None:
+                    writer.close()
+            if writer is None:
+                # No rows: still leave a valid, empty file behind
+                pd.DataFrame().to_parquet(path)
+        return {'report': report, 'path': path, 'rows': rows, 'seconds': time.perf_counter() - started}
+    except Exception as e:
+        print("❌ export_report error:", e)
+        traceback.print_exc()
+        return None
+
+# ==================================================
+# Command-line entry point
+# ==================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="StockFlow backend maintenance commands")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    import_cmd = commands.add_parser('import-products', help="Bulk import products from a CSV or Parquet file")
+    import_cmd.add_argument('path', help="CSV or Parquet file with brand, model, price, category, stock columns")
+    import_cmd.add_argument('--format', choices=['csv', 'parquet'], help="File format (default: from extension)")
+    import_cmd.add_argument('--chunk-size', type=int, default=5000, help="Rows per batch (default: 5000)")
+    import_cmd.add_argument('--supplier-id', type=int, default=1, help="Supplier for rows without one (default: 1)")
+    
+    commands.add_parser('rebuild-metrics', help="Recompute the dashboard metrics summary")
+    commands.add_parser('rebuild-inventory', help="Recompute the inventory aggregates and low-stock alerts")
+    rollup_cmd = commands.add_parser('rebuild-sales-rollup', help="Recompute the daily sales rollup from purchases")
+    rollup_cmd.add_argument('--start', type=lambda s: datetime.strptime(s, '%Y-%m-%d').date(), help="First day (YYYY-MM-DD)")
+    rollup_cmd.add_argument('--end', type=lambda s: datetime.strptime(s, '%Y-%m-%d').date(), help="Last day (YYYY-MM-DD)")
+    plan_cmd = commands.add_parser('plan-replenishment', help="Recompute demand forecasts and suggested reorder quantities")
+    plan_cmd.add_argument('--history-days', type=int, help="Days of purchases to learn demand from (default: 90)")
+    plan_cmd.add_argument('--lead-time', type=float, help="Supplier lead time in days (default: 7)")
+    plan_cmd.add_argument('--cover-days', type=float, help="Days of demand an order should cover (default: 30)")
+    report_cmd = commands.add_parser('export-report', help="Stream a report to a CSV or Parquet file")
+    report_cmd.add_argument('report', choices=list(REPORT_QUERIES), help="Report to export")
+    report_cmd.add_argument('--format', choices=['csv', 'parquet'], default='csv', help="File format (default: csv)")
+    report_cmd.add_argument('--output', help=f"File or directory to write to (default: {REPORT_DIR}/)")
+    report_cmd.add_argument('--start', type=lambda s: datetime.strptime(s, '%Y-%m-%d').date(), help="First day (YYYY-MM-DD)")
+    report_cmd.add_argument('--end', type=lambda s: datetime.strptime(s, '%Y-%m-%d').date(), help="Last day (YYYY-MM-DD)")
+    top_cmd = commands.add_parser('rebuild-top-sellers', help="Recompute the hourly best-seller counters and drop old ones")
+    top_cmd.add_argument('--days', type=int, help="Days of history to keep (default: longest leaderboard window)")
+    
+    args = parser.parse_args(argv)
+    
+    if args.command == 'import-products':
+        def show_progress(report):
+            print(f"  {report['rows_read']:,} rows read, {report['inserted']:,} inserted, "
+                  f"{report['failed']:,} failed ({report['rows_per_second']:,.0f} rows/s)")
+        report = import_products(args.path, args.format, args.chunk_size, args.supplier_id, show_progress)
+        for row, message in report['errors']:
+            print(f"  row {row}: {message}")
+        print(f"✅ Imported {report['inserted']:,} of {report['rows_read']:,} rows "
+              f"in {report['seconds']:.1f}s ({report['rows_per_second']:,.0f} rows/s)")
+        return 1 if report['failed'] else 0
+    if args.command == 'rebuild-metrics':
+        ok = rebuild_metrics_summary()
+        print("✅ Metrics summary rebuilt" if ok else "❌ Metrics rebuild failed")
+        return 0 if ok else 1
+    if args.command == 'rebuild-inventory':
+        ok = rebuild_inventory_aggregates() and rebuild_low_stock_alerts()
+        print("✅ Inventory aggregates and low-stock alerts rebuilt" if ok else "❌ Inventory rebuild failed")
+        return 0 if ok else 1
+    if args.command == 'rebuild-sales-rollup':
+        months = rebuild_sales_rollup(args.start, args.end)
+        if months is None:
+            print("❌ Sales rollup rebuild failed")
+            return 1
+        print(f"✅ Rebuilt sales rollup for {months} month(s)")
+        return 0
+    if args.command == 'plan-replenishment':
+        summary = plan_replenishment(args.history_days, args.lead_time, args.cover_days)
+        if summary is None:
+            print("❌ Replenishment planning failed")
+            return 1
+        print(f"✅ Planned {summary['products']:,} products, {summary['to_reorder']:,} to reorder "
+              f"({summary['seconds']:.1f}s)")
+        return 0
+    if args.command == 'export-report':
+        result = export_report(args.report, args.output, args.format, args.start, args.end,
+                               progress=lambda rows: print(f"  {rows:,} rows written"))
+        if result is None:
+            print("❌ Report export failed")
+            return 1
+        print(f"✅ Wrote {result['rows']:,} rows to {result['path']} in {result['seconds']:.1f}s")
+        return 0
+    if args.command == 'rebuild-top-sellers':
+        ok = rebuild_top_sellers(args.days)
+        print("✅ Best-seller counters rebuilt" if ok else "❌ Best-seller rebuild failed")
+        return 0 if ok else 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,6 +6,8 @@ import backend as db
 from datetime import datetime
 import time
 import base64
+import os
+import html
 
 # ----------------------------------------------------------------------
 # PAGE CONFIG
@@ -41,6 +43,7 @@ st.markdown("""
     .metric-label{font-size:14px;color:#7f8c8d;font-weight:500;text-transform:uppercase;letter-spacing:.5px;}
     .metric-change{font-size:13px;padding:4px 8px;border-radius:6px;display:inline-block;margin-top:8px;}
     .metric-change.positive{background:#d4edda;color:#155724;}
+    .metric-change.negative{background:#f8d7da;color:#721c24;}
     .section-header{font-size:20px;font-weight:600;color:#2c3e50;margin:30px 0 15px 0;padding-bottom:10px;border-bottom:2px solid #e9ecef;}
     .stButton>button{border-radius:8px;padding:8px 20px;font-weight:500;transition:all .3s;border:none;}
     .status-badge{padding:4px 12px;border-radius:12px;font-size:12px;font-weight:600;}
@@ -118,6 +121,153 @@ if 'chat_assistant' not in st.session_state:
     st.session_state.chat_assistant = None
 if 'chat_input_key' not in st.session_state:
     st.session_state.chat_input_key = 0
+if 'cart' not in st.session_state:
+    st.session_state.cart = {}
+
+# ----------------------------------------------------------------------
+# PAGINATION HELPERS
+# ----------------------------------------------------------------------
+PRODUCT_SORT_LABELS = {
+    "Name": "name",
+    "Price: Low to High": "price",
+    "Price: High to Low": "price_desc",
+    "Stock: Low to High": "stock"
+}
+
+def fetch_product_page(state_key, page_size, **filters):
+    """Fetch the current page of a keyset-paged product list.
+
+    The cursors of the pages visited so far are kept in session state so
+    that "Previous" can step back; changing any filter starts over.
+    """
+    filter_key = tuple(sorted(filters.items()))
+    state = st.session_state.get(state_key)
+    if state is None or state['filters'] != filter_key:
+        state = {'filters': filter_key, 'cursors': [None]}
+        st.session_state[state_key] = state
+    page, total, next_cursor = db.get_products_page(cursor=state['cursors'][-1], limit=page_size, **filters)
+    state['next'] = next_cursor
+    return page, total
+
+def draw_pager(state_key, total, page_size):
+    state = st.session_state[state_key]
+    page_no = len(state['cursors'])
+    total_pages = max(1, -(-total // page_size))
+    p1, p2, p3 = st.columns([1, 2, 1])
+    with p1:
+        if st.button("← Previous", key=f"{state_key}_prev", disabled=page_no == 1, use_container_width=True):
+            state['cursors'].pop()
+            st.rerun()
+    with p2:
+        st.markdown(f"<div style='text-align:center;'>Page {page_no} of {total_pages}</div>", unsafe_allow_html=True)
+    with p3:
+        if st.button("Next →", key=f"{state_key}_next", disabled=state['next'] is None, use_container_width=True):
+            state['cursors'].append(state['next'])
+            st.rerun()
+
+def fetch_search_page(state_key, page_size, query, category=None):
+    """Fetch the current page of relevance-ranked search results.
+
+    Ranked results are paged by offset; a new query or category starts over.
+    """
+    filter_key = (query, category)
+    state = st.session_state.get(state_key)
+    if state is None or state['filters'] != filter_key:
+        state = {'filters': filter_key, 'page': 0}
+        st.session_state[state_key] = state
+    # One extra row tells us whether another page follows
+    df = db.search_products(query, limit=page_size + 1, category=category, offset=state['page'] * page_size)
+    state['more'] = len(df) > page_size
+    return df.head(page_size)
+
+def draw_search_pager(state_key):
+    state = st.session_state[state_key]
+    p1, p2, p3 = st.columns([1, 2, 1])
+    with p1:
+        if st.button("← Previous", key=f"{state_key}_prev", disabled=state['page'] == 0, use_container_width=True):
+            state['page'] -= 1
+            st.rerun()
+    with p2:
+        st.markdown(f"<div style='text-align:center;'>Page {state['page'] + 1}</div>", unsafe_allow_html=True)
+    with p3:
+        if st.button("Next →", key=f"{state_key}_next", disabled=not state['more'], use_container_width=True):
+            state['page'] += 1
+            st.rerun()
+
+# ----------------------------------------------------------------------
+# ACTIVITY FEED HELPERS
+# ----------------------------------------------------------------------
+ACTIVITY_FEED_SIZE = 5
+
+def refresh_activity_feed():
+    """Return the newest activity events, fetching only those added since the last rerun"""
+    feed = st.session_state.get('activity_feed')
+    if feed:
+        new_events = db.get_activity_since(feed[0]['id'], limit=ACTIVITY_FEED_SIZE)
+        if len(new_events) < ACTIVITY_FEED_SIZE:
+            feed = (new_events[::-1] + feed)[:ACTIVITY_FEED_SIZE]
+        else:
+            feed = None
+    if not feed:
+        feed = db.get_recent_activity(ACTIVITY_FEED_SIZE)
+    st.session_state.activity_feed = feed
+    return feed
+
+def time_ago(moment):
+    seconds = max(0, int((datetime.now() - moment).total_seconds()))
+    if seconds < 60:
+        return "just now"
+    for unit, size in (("day", 86400), ("hour", 3600), ("min", 60)):
+        if seconds >= size:
+            count = seconds // size
+            return f"{count} {unit}{'s' if count > 1 else ''} ago"
+
+# ----------------------------------------------------------------------
+# CHART HELPERS
+# ----------------------------------------------------------------------
+# Figures are cached per backend data version, so reruns that change no data
+# reuse the built figure. Arguments starting with "_" are not hashed by
+# Streamlit; the data version and range stand in for them.
+def build_sales_figure(sales, granularity):
+    if granularity == 'month':
+        fig = go.Figure(data=[go.Bar(
+            x=sales['period'].dt.strftime('%b %Y'),
+            y=sales['sales'],
+            text=sales['sales'],
+            textposition='outside',
+            marker_color='#667eea'
+        )])
+    else:
+        fig = go.Figure(data=[go.Scatter(
+            x=sales['period'],
+            y=sales['sales'],
+            mode='lines',
+            line=dict(color='#667eea', width=2)
+        )])
+    fig.update_layout(
+        height=400,
+        margin=dict(l=20, r=20, t=20, b=20),
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        showlegend=False,
+        xaxis_title=None,
+        yaxis_title=None
+    )
+    return fig
+
+def build_category_figure(categories):
+    fig = px.pie(categories, values='count', names='category', hole=0.5,
+                 color_discrete_sequence=['#667eea','#4a90e2','#5cb3cc','#7ed8d8'])
+    fig.update_layout(height=400, margin=dict(l=20, r=20, t=20, b=20), showlegend=True)
+    return fig
+
+@st.cache_resource(ttl=db.CACHE_CONFIG['ttl'], max_entries=32)
+def cached_sales_figure(data_version, range_key, granularity, _sales):
+    return build_sales_figure(_sales, granularity)
+
+@st.cache_resource(ttl=db.CACHE_CONFIG['ttl'], max_entries=8)
+def cached_category_figure(data_version, _categories):
+    return build_category_figure(_categories)
 
 # ----------------------------------------------------------------------
 # LOGIN PAGE WITH REGISTRATION
@@ -304,8 +454,7 @@ if st.session_state.current_page == "Voice Assistant":
                     }
                     st.session_state.last_voice_response = responses[command]
                 else:
-                    products_df = db.get_products()
-                    response = db.voice_assistant.process_voice_command(command, products_df, role)
+                    response = db.voice_assistant.process_voice_command(command, role)
                     st.session_state.last_voice_response = response
                     
                     # Speak the response
@@ -325,8 +474,7 @@ if st.session_state.current_page == "Voice Assistant":
         
         for action in quick_actions:
             if st.button(action, key=f"qa_{action}", use_container_width=True):
-                products_df = db.get_products()
-                response = db.voice_assistant.process_voice_command(action, products_df, role)
+                response = db.voice_assistant.process_voice_command(action, role)
                 st.session_state.last_voice_response = response
                 db.voice_assistant.speak(response)
                 st.rerun()
@@ -364,7 +512,7 @@ elif st.session_state.current_page == "Chat Assistant":
     
     # Initialize chat assistant in session state
     if st.session_state.chat_assistant is None:
-        st.session_state.chat_assistant = db.ChatAssistant()
+        st.session_state.chat_assistant = db.ChatAssistant(user.get("id"))
     
     # Display chat messages
     st.markdown("### 💬 Conversation")
@@ -392,6 +540,12 @@ elif st.session_state.current_page == "Chat Assistant":
             </div>
             """, unsafe_allow_html=True)
         else:
+            # Older messages stay in the database until asked for
+            if st.session_state.chat_assistant.has_earlier_messages():
+                if st.button("⬆ Load earlier messages", key="chat_load_earlier"):
+                    st.session_state.chat_assistant.load_earlier_messages()
+                    st.rerun()
+            
             # Display all messages in the conversation
             for msg in conversation_history:
                 if msg['role'] == 'user':
@@ -446,21 +600,19 @@ elif st.session_state.current_page == "Chat Assistant":
         with cols[i]:
             if st.button(question, key=f"qq_{i}", use_container_width=True):
                 # Process the quick question
-                products_df = db.get_products()
                 user_id = user.get("id")
                 response = st.session_state.chat_assistant.get_response(
-                    question, products_df, role, user_id
+                    question, role, user_id
                 )
                 st.rerun()
     
     # Process user input from form
     if submitted and user_input.strip():
-        products_df = db.get_products()
         user_id = user.get("id")
         
         # Get response from chat assistant
         response = st.session_state.chat_assistant.get_response(
-            user_input, products_df, role, user_id
+            user_input, role, user_id
         )
         
         # Increment the key to reset the input field
@@ -543,15 +695,36 @@ elif st.session_state.current_page == "Team Analytics" and role == "admin":
         with col2:
             filter_role = st.selectbox("Filter by role", ["All", "admin", "employee", "customer"])
         
-        # Apply filters
-        filtered_users = users_df.copy()
-        if search_user:
-            filtered_users = filtered_users[filtered_users['username'].str.contains(search_user, case=False, na=False)]
-        if filter_role != "All":
-            filtered_users = filtered_users[filtered_users['role'] == filter_role]
-        
+        # Apply filters and fetch one page of users with their spend totals
+        page_size = 25
+        filter_key = (search_user, filter_role)
+        if st.session_state.get("team_filter_key") != filter_key:
+            st.session_state.team_filter_key = filter_key
+            st.session_state.team_page = 0
+        page = st.session_state.get("team_page", 0)
+        filtered_users, total_matches = db.get_customer_spend(
+            search=search_user or None,
+            role=None if filter_role == "All" else filter_role,
+            limit=page_size,
+            offset=page * page_size
+        )
+        filtered_users = filtered_users.rename(columns={'user_id': 'id'})
+
         # Display user table
         if not filtered_users.empty:
+            total_pages = max(1, -(-total_matches // page_size))
+            p1, p2, p3 = st.columns([1, 2, 1])
+            with p1:
+                if st.button("← Previous", key="team_prev", disabled=page == 0, use_container_width=True):
+                    st.session_state.team_page = page - 1
+                    st.rerun()
+            with p2:
+                st.markdown(f"<div style='text-align:center;'>Page {page + 1} of {total_pages} ({total_matches} users)</div>", unsafe_allow_html=True)
+            with p3:
+                if st.button("Next →", key="team_next", disabled=page + 1 >= total_pages, use_container_width=True):
+                    st.session_state.team_page = page + 1
+                    st.rerun()
+
             for _, user_row in filtered_users.iterrows():
                 with st.container():
                     c1, c2, c3, c4 = st.columns([3, 2, 2, 1])
@@ -564,9 +737,8 @@ elif st.session_state.current_page == "Team Analytics" and role == "admin":
                     with c3:
                         # Show user activity based on role
                         if user_row['role'] == 'customer':
-                            purchases = db.get_purchase_history(user_row['id'])
-                            total_spent = (purchases['price'] * purchases['quantity']).sum() if not purchases.empty else 0
-                            st.markdown(f"**Total Spent:** ₹{total_spent:,.0f}")
+                            st.markdown(f"**Total Spent:** ₹{user_row['total_spent']:,.0f}")
+                            st.caption(f"{user_row['order_count']} orders | Last purchase: {user_row['last_purchase'] if pd.notna(user_row['last_purchase']) else '—'}")
                         elif user_row['role'] == 'employee':
                             st.markdown("**Employee**")
                         else:
@@ -598,25 +770,78 @@ elif role == "customer":
             </div>
         """, unsafe_allow_html=True)
 
-        prods = db.get_products()
-        # Filter only available products (stock > 0)
-        avail = prods[prods['stock'] > 0].copy()
+        # ---- CART ----
+        cart = st.session_state.cart
+        if st.session_state.get("cart_results"):
+            for line in st.session_state.cart_results:
+                if line['success']:
+                    st.success(f"{line['product_name']} × {line['quantity']} - {line['message']}")
+                else:
+                    st.error(f"{line['product_name']} × {line['quantity']} - {line['message']}")
+            del st.session_state.cart_results
+        if cart:
+            with st.expander(f"🛒 Your Cart ({sum(line['quantity'] for line in cart.values())} items)", expanded=True):
+                for pid, line in list(cart.items()):
+                    c1, c2, c3, c4 = st.columns([3, 2, 2, 1])
+                    with c1:
+                        st.markdown(f"{line['product_name']}")
+                        st.caption(f"₹{line['price']:,.0f} each")
+                    with c2:
+                        line['quantity'] = st.number_input("Qty", min_value=1, value=line['quantity'], step=1,
+                                                           key=f"cq_{pid}", label_visibility="collapsed")
+                    with c3:
+                        st.markdown(f"*₹{line['price'] * line['quantity']:,.0f}*")
+                    with c4:
+                        if st.button("✖", key=f"cr_{pid}", help="Remove from cart"):
+                            del cart[pid]
+                            st.rerun()
+                cart_total = sum(line['price'] * line['quantity'] for line in cart.values())
+                st.markdown(f"**Total: ₹{cart_total:,.0f}**")
+                k1, k2, _ = st.columns([1, 1, 3])
+                with k1:
+                    if st.button("Checkout", key="cart_checkout", type="primary", use_container_width=True):
+                        ok, msg, results = db.checkout(user_id, [dict(line, product_id=pid) for pid, line in cart.items()])
+                        for line in results:
+                            if line['success']:
+                                cart.pop(line['product_id'], None)
+                        st.session_state.cart_results = results
+                        if ok:
+                            st.balloons()
+                        st.rerun()
+                with k2:
+                    if st.button("Empty Cart", key="cart_clear", use_container_width=True):
+                        cart.clear()
+                        st.rerun()
+
+        page_size = 24
+        fc, sc = st.columns([2, 1])
+        with fc:
+            cats = ["All"] + list(db.get_product_categories()['category'])
+            sel = st.selectbox("Filter by Category", cats, key="cust_cat")
+        with sc:
+            sort_label = st.selectbox("Sort by", list(PRODUCT_SORT_LABELS), key="cust_sort")
+        # Only available products (stock > 0), one page at a time
+        df, total = fetch_product_page("cust_pages", page_size,
+                                       category=None if sel == "All" else sel,
+                                       in_stock_only=True,
+                                       sort=PRODUCT_SORT_LABELS[sort_label])
         
-        if avail.empty:
-            st.info("All products are currently out of stock. Please check back later.")
+        if df.empty:
+            if sel == "All":
+                st.info("All products are currently out of stock. Please check back later.")
+            else:
+                st.info("No products available in this category right now.")
         else:
-            cats = ["All"] + list(avail['category'].unique())
-            sel = st.selectbox("Filter by Category", cats, key="cust_cat")
-            df = avail if sel=="All" else avail[avail['category']==sel]
-
-            st.markdown(f"*Showing {len(df)} products*")
+            first = (len(st.session_state.cust_pages['cursors']) - 1) * page_size
+            st.markdown(f"*Showing {first + 1}–{first + len(df)} of {total} products*")
             st.markdown("<br>", unsafe_allow_html=True)
             
+            favorite_ids = db.get_favorite_ids(user_id)
             # Display products in cards (3 columns)
             cols = st.columns(3)
             for i, (_, r) in enumerate(df.iterrows()):
                 with cols[i % 3]:
-                    low_stock = r['stock'] < 10
+                    low_stock = r['stock'] < r['reorder_level']
                     out_of_stock = r['stock'] == 0
                     
                     st.markdown(f"""
@@ -637,7 +862,7 @@ elif role == "customer":
                     # Buttons for favorite and purchase
                     fcol, bcol = st.columns(2)
                     with fcol:
-                        fav = db.is_favorite(user_id, r['id'])
+                        fav = r['id'] in favorite_ids
                         lbl = "❤ Remove" if fav else "🤍 Favorite"
                         if st.button(lbl, key=f"f_{r['id']}", use_container_width=True):
                             if fav:
@@ -647,12 +872,24 @@ elif role == "customer":
                             st.rerun()
                     with bcol:
                         if st.button("🛒 Buy Now", key=f"b_{r['id']}", type="primary", use_container_width=True):
-                            if db.purchase_product(user_id, r['id'], r['name'], r['price'], 1):
-                                st.success(f"Successfully purchased {r['name']}!")
+                            ok, msg = db.purchase_product(user_id, r['id'], r['name'], r['price'], 1)
+                            if ok:
+                                st.success(msg)
                                 st.balloons()
                                 st.rerun()
                             else:
-                                st.error("Failed to complete purchase")
+                                st.error(msg)
+                    if st.button("➕ Add to Cart", key=f"c_{r['id']}", use_container_width=True):
+                        pid = int(r['id'])
+                        if pid in cart:
+                            cart[pid]['quantity'] += 1
+                        else:
+                            cart[pid] = {'product_name': r['name'], 'price': float(r['price']), 'quantity': 1}
+                        st.rerun()
+
+        # Also on an emptied page (its last product sold out), so the user can step back
+        if not df.empty or len(st.session_state.cust_pages['cursors']) > 1:
+            draw_pager("cust_pages", total, page_size)
 
     # ----- PURCHASE HISTORY -----
     elif st.session_state.current_page == "Purchase History":
@@ -708,9 +945,12 @@ elif role == "customer":
                         st.rerun()
                 with c3:
                     if st.button("Buy Now", key=f"bf_{r['product_id']}", type="primary", use_container_width=True):
-                        db.purchase_product(user_id, r['product_id'], r['product_name'], r['price'], 1)
-                        st.success("Purchased successfully!")
-                        st.rerun()
+                        ok, msg = db.purchase_product(user_id, r['product_id'], r['product_name'], r['price'], 1)
+                        if ok:
+                            st.success(msg)
+                            st.rerun()
+                        else:
+                            st.error(msg)
 
     # ----- FEEDBACK -----
     elif st.session_state.current_page == "Feedback":
@@ -745,28 +985,72 @@ elif role == "employee" and st.session_state.current_page == "Dashboard":
         </div>
     """, unsafe_allow_html=True)
 
-    prods = db.get_products()
+    # Notify about threshold crossings since the last rerun
+    if 'low_stock_cursor' not in st.session_state:
+        st.session_state.low_stock_cursor = db.get_low_stock_cursor()
+    for change in db.get_low_stock_changes(st.session_state.low_stock_cursor, limit=20):
+        st.session_state.low_stock_cursor = change['id']
+        if change['name'] is None:
+            continue  # product deleted since
+        if change['event'] == 'low':
+            st.toast(f"⚠ {change['name']} dropped to {change['stock']} (threshold {change['threshold']})")
+        else:
+            st.toast(f"✅ {change['name']} restocked to {change['stock']}")
+
+    totals = db.get_inventory_totals()
     c1,c2,c3 = st.columns(3)
-    with c1: 
-        st.metric("Total Products", len(prods))
-    with c2: 
-        low_stock = len(prods[prods['stock']<10])
-        st.metric("Low Stock (<10)", low_stock, delta=f"-{low_stock}" if low_stock > 0 else None)
-    with c3: 
-        out_of_stock = len(prods[prods['stock']==0])
-        st.metric("Out of Stock", out_of_stock)
+    with c1:
+        st.metric("Total Products", totals['total_products'])
+    with c2:
+        low_stock = totals['low_stock']
+        st.metric("Low Stock", low_stock, delta=f"-{low_stock}" if low_stock > 0 else None)
+    with c3:
+        st.metric("Out of Stock", totals['out_of_stock'])
 
     st.markdown("<h3 class='section-header'>Low Stock Alerts</h3>", unsafe_allow_html=True)
-    low = prods[prods['stock']<10]
+    alert_limit = 50
+    low = db.get_low_stock_items(limit=alert_limit)
     if not low.empty:
         for _,r in low.iterrows():
-            if r['stock'] == 0:
-                st.error(f"{r['name']}** - OUT OF STOCK!")
+            suggestion = f" - suggested order: {int(r['suggested_qty'])}" if pd.notna(r['suggested_qty']) and r['suggested_qty'] > 0 else ""
+            if r['stock'] <= 0:
+                st.error(f"**{r['name']}** - OUT OF STOCK!{suggestion}")
             else:
-                st.warning(f"{r['name']}** - only {r['stock']} left in stock!")
+                st.warning(f"**{r['name']}** - only {r['stock']} left in stock (reorder at {r['threshold']}){suggestion}")
+        if low_stock > len(low):
+            st.caption(f"Showing the {len(low)} lowest of {low_stock} low-stock products")
     else:
         st.success("All items sufficiently stocked")
 
+    st.markdown("<h3 class='section-header'>Reorder Suggestions</h3>", unsafe_allow_html=True)
+    plan = db.get_replenishment_plan(limit=20)
+    if not plan.empty:
+        st.caption(f"Forecast from recent sales, computed {plan['computed_at'].max():%d %b %Y %H:%M}")
+        st.dataframe(
+            plan[['name', 'brand', 'stock', 'demand_rate', 'reorder_point', 'suggested_qty']],
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                'name': "Product",
+                'brand': "Brand",
+                'stock': "Stock",
+                'demand_rate': st.column_config.NumberColumn("Units/day", format="%.2f"),
+                'reorder_point': "Reorder point",
+                'suggested_qty': "Order qty"
+            }
+        )
+    else:
+        st.info("No reorders suggested by the current plan.")
+    if st.button("Recalculate Plan", key="plan_replenishment"):
+        with st.spinner("Forecasting demand..."):
+            summary = db.plan_replenishment()
+        if summary:
+            st.success(f"Planned {summary['products']:,} products, {summary['to_reorder']:,} to reorder "
+                       f"in {summary['seconds']:.1f}s")
+            st.rerun()
+        else:
+            st.error("Replenishment planning failed")
+
     st.markdown("<h3 class='section-header'>Report Issue to Admin</h3>", unsafe_allow_html=True)
     with st.form("issue_form"):
         message = st.text_area("Describe the issue", placeholder="What issue are you facing?")
@@ -789,7 +1073,19 @@ elif role == "admin" and st.session_state.current_page == "Dashboard":
         </div>
     """, unsafe_allow_html=True)
 
-    metrics = db.get_dashboard_metrics()
+    # Read the version before loading so figures are never cached under a newer one
+    data_version = db.get_data_version()
+    sales_range = st.session_state.get('sales_range', '6m')
+    dashboard = db.load_dashboard(
+        sales_chart={'range_key': sales_range},
+        top_products={
+            'window': st.session_state.get('top_window', '7d'),
+            'by': st.session_state.get('top_by', 'units')
+        })
+    degraded = dashboard['timed_out'] + dashboard['failed']
+    if degraded:
+        st.warning("Some dashboard panels are showing sample data: " + ", ".join(degraded))
+    metrics = dashboard['metrics']
     c1,c2,c3,c4 = st.columns(4)
     with c1:
         st.markdown(f"""
@@ -798,7 +1094,7 @@ elif role == "admin" and st.session_state.current_page == "Dashboard":
                     <div style='flex:1;'>
                         <div class='metric-label'>Total Products</div>
                         <div class='metric-value'>{metrics['total_products']:,}</div>
-                        <div class='metric-change positive'>+{metrics['products_change']}%</div>
+                        <div class='metric-change {"negative" if metrics['products_change'] < 0 else "positive"}'>{metrics['products_change']:+}%</div>
                     </div>
                     <div style='font-size:40px;margin-left:10px;'>📦</div>
                 </div>
@@ -811,7 +1107,7 @@ elif role == "admin" and st.session_state.current_page == "Dashboard":
                     <div style='flex:1;'>
                         <div class='metric-label'>Total Orders</div>
                         <div class='metric-value'>{metrics['total_orders']:,}</div>
-                        <div class='metric-change positive'>+{metrics['orders_change']}%</div>
+                        <div class='metric-change {"negative" if metrics['orders_change'] < 0 else "positive"}'>{metrics['orders_change']:+}%</div>
                     </div>
                     <div style='font-size:40px;margin-left:10px;'>🛒</div>
                 </div>
@@ -824,7 +1120,7 @@ elif role == "admin" and st.session_state.current_page == "Dashboard":
                     <div style='flex:1;'>
                         <div class='metric-label'>Active Customers</div>
                         <div class='metric-value'>{metrics['active_customers']:,}</div>
-                        <div class='metric-change positive'>+{metrics['customers_change']}%</div>
+                        <div class='metric-change {"negative" if metrics['customers_change'] < 0 else "positive"}'>{metrics['customers_change']:+}%</div>
                     </div>
                     <div style='font-size:40px;margin-left:10px;'>👥</div>
                 </div>
@@ -837,7 +1133,7 @@ elif role == "admin" and st.session_state.current_page == "Dashboard":
                     <div style='flex:1;'>
                         <div class='metric-label'>Revenue</div>
                         <div class='metric-value'>₹{metrics['revenue']:,.0f}</div>
-                        <div class='metric-change positive'>+{metrics['revenue_change']}%</div>
+                        <div class='metric-change {"negative" if metrics['revenue_change'] < 0 else "positive"}'>{metrics['revenue_change']:+}%</div>
                     </div>
                     <div style='font-size:40px;margin-left:10px;'>💰</div>
                 </div>
@@ -847,59 +1143,70 @@ elif role == "admin" and st.session_state.current_page == "Dashboard":
     st.markdown("<br><br>", unsafe_allow_html=True)
     col_chart1, col_chart2 = st.columns([3,2])
     with col_chart1:
-        st.markdown("### Sales Overview")
-        sales = db.get_sales_overview()
-        fig = go.Figure(data=[go.Bar(
-            x=sales['month'],
-            y=sales['sales'],
-            text=sales['sales'],
-            textposition='outside',
-            marker_color='#667eea'
-        )])
-        fig.update_layout(
-            height=400,
-            margin=dict(l=20, r=20, t=20, b=20),
-            plot_bgcolor='white',
-            paper_bgcolor='white',
-            showlegend=False,
-            xaxis_title=None,
-            yaxis_title=None
-        )
-        st.plotly_chart(fig, use_container_width=True)
+        h1, h2 = st.columns([2, 1])
+        with h1:
+            st.markdown("### Sales Overview")
+        with h2:
+            st.selectbox("Range", list(db.SALES_CHART_RANGES), key="sales_range", label_visibility="collapsed",
+                         format_func=lambda key: db.SALES_CHART_RANGES[key][0])
+        sales = dashboard['sales_chart']
+        granularity = db.SALES_CHART_RANGES[sales_range][2]
+        if sales.empty:
+            st.info("No sales in this period yet.")
+        elif 'sales_chart' in degraded:
+            st.plotly_chart(build_sales_figure(sales, 'month'), use_container_width=True)
+        else:
+            st.plotly_chart(cached_sales_figure(data_version, sales_range, granularity, sales),
+                            use_container_width=True)
 
     with col_chart2:
         st.markdown("### Product Categories")
-        cat = db.get_product_categories()
-        fig = px.pie(cat, values='count', names='category', hole=0.5,
-                     color_discrete_sequence=['#667eea','#4a90e2','#5cb3cc','#7ed8d8'])
-        fig.update_layout(height=400, margin=dict(l=20, r=20, t=20, b=20), showlegend=True)
-        st.plotly_chart(fig, use_container_width=True)
+        cat = dashboard['categories']
+        if cat.empty:
+            st.info("No products yet.")
+        elif 'categories' in degraded:
+            st.plotly_chart(build_category_figure(cat), use_container_width=True)
+        else:
+            st.plotly_chart(cached_category_figure(data_version, cat), use_container_width=True)
 
     st.markdown("<br>", unsafe_allow_html=True)
     col_act, col_prod = st.columns([2,3])
     with col_act:
         st.markdown("### Recent Activity")
-        for a in db.get_recent_activity():
+        feed = refresh_activity_feed()
+        if not feed:
+            st.info("No activity yet.")
+        for a in feed:
             st.markdown(f"""
                 <div style='background:#f8f9fa;padding:15px;border-radius:8px;margin-bottom:12px;border-left:4px solid #667eea;'>
                     <div style='display:flex;align-items:center;'>
                         <span style='font-size:24px;margin-right:12px;'>{a['icon']}</span>
                         <div>
-                            <div style='font-weight:500;color:#2c3e50;'>{a['text']}</div>
-                            <div style='font-size:12px;color:#7f8c8d;margin-top:3px;'>{a['time']}</div>
+                            <div style='font-weight:500;color:#2c3e50;'>{html.escape(a['text'])}</div>
+                            <div style='font-size:12px;color:#7f8c8d;margin-top:3px;'>{time_ago(a['time'])}</div>
                         </div>
                     </div>
                 </div>
             """, unsafe_allow_html=True)
     with col_prod:
         st.markdown("### Top Products")
-        for _,r in db.get_top_products().iterrows():
+        tw, tb = st.columns(2)
+        with tw:
+            st.selectbox("Window", list(db.TOP_SELLER_WINDOWS), index=1, key="top_window")
+        with tb:
+            st.selectbox("Rank by", list(db.TOP_SELLER_SORTS), key="top_by",
+                         format_func=lambda s: s.title())
+        top = dashboard['top_products']
+        if top.empty:
+            st.info("No sales in this period yet.")
+        for _,r in top.iterrows():
+            value = f"₹{r['revenue']:,.0f}" if st.session_state.top_by == 'revenue' else f"{int(r['units']):,} sold"
             st.markdown(f"""
                 <div style='display:flex;justify-content:space-between;align-items:center;
                            padding:15px;background:#f8f9fa;border-radius:8px;margin-bottom:10px;
                            border-left:4px solid #667eea;'>
                     <div style='font-weight:500;color:#2c3e50;font-size:15px;'>{r['product']}</div>
-                    <div style='color:#667eea;font-weight:700;font-size:16px;'>₹{r['price']:,.0f}</div>
+                    <div style='color:#667eea;font-weight:700;font-size:16px;'>{value}</div>
                 </div>
             """, unsafe_allow_html=True)
 
@@ -966,81 +1273,179 @@ elif st.session_state.current_page == "Products" and role in ["admin","employee"
         if "show_add_form" in st.session_state:
             st.session_state.show_add_form = False
 
+        with st.expander("📥 Bulk Import Products"):
+            st.caption("CSV or Parquet file with columns: brand, model, price, category, stock, supplier_id (optional)")
+            upload = st.file_uploader("Catalog file", type=["csv", "parquet"], key="bulk_file")
+            i1, i2 = st.columns([1, 1])
+            with i1:
+                import_sup = st.number_input("Default Supplier ID", min_value=1, value=1, key="bulk_sup")
+            with i2:
+                import_chunk = st.number_input("Rows per batch", min_value=100, value=5000, step=100, key="bulk_chunk")
+            if st.button("Import", type="primary", disabled=upload is None, key="bulk_import"):
+                bar = st.progress(0.0, text="Importing...")
+                size = max(upload.size, 1)
+                def show_progress(report):
+                    done = min(upload.tell() / size, 1.0) if upload.name.lower().endswith(".csv") else 0.5
+                    bar.progress(done, text=f"{report['rows_read']:,} rows read ({report['rows_per_second']:,.0f} rows/s)")
+                report = db.import_products(upload, chunk_size=int(import_chunk),
+                                            default_supplier_id=int(import_sup), progress=show_progress)
+                bar.progress(1.0, text="Import finished")
+                r1, r2, r3 = st.columns(3)
+                with r1:
+                    st.metric("Inserted", f"{report['inserted']:,}")
+                with r2:
+                    st.metric("Failed", f"{report['failed']:,}")
+                with r3:
+                    st.metric("Throughput", f"{report['rows_per_second']:,.0f} rows/s")
+                if report['errors']:
+                    st.dataframe(pd.DataFrame(report['errors'], columns=["Row", "Error"]),
+                                 use_container_width=True, hide_index=True)
+
+        with st.expander("🔔 Reorder Thresholds"):
+            st.caption(f"Products below their threshold are flagged as low stock. "
+                       f"A product's own level overrides its category's; the default is {db.LOW_STOCK_THRESHOLD}.")
+            t1, t2 = st.columns(2)
+            with t1:
+                st.markdown("**Category threshold**")
+                rules = db.get_reorder_thresholds()
+                if not rules.empty:
+                    st.dataframe(rules, use_container_width=True, hide_index=True)
+                rule_cat = st.selectbox("Category", list(db.get_product_categories()['category']), key="rule_cat")
+                rule_value = st.number_input("Threshold", min_value=0, value=db.LOW_STOCK_THRESHOLD, step=1, key="rule_value")
+                r1, r2 = st.columns(2)
+                with r1:
+                    if st.button("Save", key="rule_save", use_container_width=True):
+                        if db.set_category_threshold(rule_cat, int(rule_value)):
+                            st.success(f"Threshold for {rule_cat} set to {int(rule_value)}")
+                            st.rerun()
+                        else:
+                            st.error("Failed to save threshold")
+                with r2:
+                    if st.button("Use default", key="rule_reset", use_container_width=True):
+                        if db.set_category_threshold(rule_cat, None):
+                            st.rerun()
+                        else:
+                            st.error("Failed to reset threshold")
+            with t2:
+                st.markdown("**Product reorder level**")
+                level_pid = st.number_input("Product ID", min_value=1, step=1, key="level_pid")
+                level_value = st.number_input("Reorder level", min_value=0, value=db.LOW_STOCK_THRESHOLD, step=1, key="level_value")
+                l1, l2 = st.columns(2)
+                with l1:
+                    if st.button("Save", key="level_save", use_container_width=True):
+                        if db.set_reorder_level(int(level_pid), int(level_value)):
+                            st.success(f"Reorder level for product #{int(level_pid)} set to {int(level_value)}")
+                        else:
+                            st.error("Failed to save reorder level")
+                with l2:
+                    if st.button("Use category", key="level_reset", use_container_width=True):
+                        if db.set_reorder_level(int(level_pid), None):
+                            st.success(f"Product #{int(level_pid)} now follows its category threshold")
+                        else:
+                            st.error("Failed to reset reorder level")
+
     # ---- INVENTORY TABLE ----
     st.markdown("<h3 class='section-header'>Product Inventory</h3>", unsafe_allow_html=True)
-    products = db.get_products()
-    if products.empty:
+    page_size = 50
+    cs, cf, co = st.columns([2,1,1])
+    with cs:
+        search = st.text_input("Search products...", placeholder="Search by name, brand, or category")
+    with cf:
+        filt = st.selectbox("Filter by category",["All"]+list(db.get_product_categories()['category']))
+    with co:
+        sort_label = st.selectbox("Sort by", list(PRODUCT_SORT_LABELS), key="inv_sort")
+    category = None if filt == "All" else filt
+    if search:
+        # Ranked full-text search, paged in relevance order
+        df = fetch_search_page("inv_search", page_size, search, category)
+    else:
+        df, total = fetch_product_page("inv_pages", page_size, category=category,
+                                       sort=PRODUCT_SORT_LABELS[sort_label])
+    if df.empty:
         st.info("No products found")
     else:
-        cs, cf = st.columns([2,1])
-        with cs:
-            search = st.text_input("Search products...", placeholder="Search by name, brand, or category")
-        with cf:
-            filt = st.selectbox("Filter by category",["All"]+list(products['category'].unique()))
-        
-        df = products.copy()
-        if search:
-            mask = (df['name'].str.contains(search, case=False, na=False) |
-                    df['brand'].str.contains(search, case=False, na=False) |
-                    df['category'].str.contains(search, case=False, na=False))
-            df = df[mask]
-        if filt != "All":
-            df = df[df['category']==filt]
-
+        # Totals cover every matching product, not just this page
+        totals = db.get_inventory_totals(category=category, search=search or None)
         m1,m2,m3 = st.columns(3)
         with m1: 
-            st.metric("Total Products", len(df))
+            st.metric("Total Products", totals['total_products'])
         with m2: 
-            total_value = (df['price'] * df['stock']).sum()
-            st.metric("Inventory Value", f"₹{total_value:,.0f}")
+            st.metric("Inventory Value", f"₹{totals['stock_value']:,.0f}")
         with m3: 
-            low_stock_count = len(df[df['stock']<10])
-            st.metric("Low Stock (<10)", low_stock_count, delta=f"-{low_stock_count}" if low_stock_count > 0 else None)
+            low_stock_count = totals['low_stock']
+            st.metric("Low Stock", low_stock_count, delta=f"-{low_stock_count}" if low_stock_count > 0 else None)
         
         st.markdown("<br>", unsafe_allow_html=True)
 
-        for _,r in df.iterrows():
-            with st.container():
-                c1,c2,c3,c4,c5 = st.columns([3,2,2,2,2])
-                with c1:
-                    st.markdown(f"{r['name']}")
-                    st.caption(f"{r['brand']} | {r['category']}")
-                with c2:
-                    st.markdown(f"*₹{r['price']:,.0f}*")
-                with c3:
-                    col = "green" if r['stock']>10 else "orange" if r['stock']>0 else "red"
-                    st.markdown(f"<span style='color:{col};font-weight:600;'>Stock: {r['stock']}</span>", unsafe_allow_html=True)
-                with c4:
-                    sts = r.get('stock_status','In Stock')
-                    if sts == 'In Stock':
-                        cls = 'status-instock'
-                    elif sts == 'Low Stock':
-                        cls = 'status-lowstock'
-                    else:
-                        cls = 'status-outofstock'
-                    st.markdown(f"<span class='status-badge {cls}'>{sts}</span>", unsafe_allow_html=True)
-                with c5:
-                    if role=="admin":
-                        a1,a2 = st.columns(2)
-                        with a1:
-                            if st.button("🔄", key=f"t_{r['id']}", help="Toggle Status"):
-                                st.info("Toggle functionality would be implemented here")
-                        with a2:
-                            if st.button("🗑", key=f"d_{r['id']}", help="Delete Product"):
-                                if db.delete_product(r['id']):
-                                    st.success("Product deleted!")
-                                    st.rerun()
-                                else:
-                                    st.error("Failed to delete product")
-                    elif role=="employee":
-                        new_stock = st.number_input("New Stock", min_value=0, value=int(r['stock']), key=f"ns_{r['id']}", label_visibility="collapsed")
-                        if st.button("Update", key=f"up_{r['id']}"):
-                            if db.update_product_stock_qty(r['id'], new_stock):
-                                st.success("Stock updated!")
-                                st.rerun()
-                            else:
-                                st.error("Failed to update stock")
-                st.divider()
+        if role == "employee":
+            # Editable grid: change any number of stock cells and save them together
+            editor_key = f"stock_editor_search_{st.session_state.inv_search['page']}" if search else f"stock_editor_{len(st.session_state.inv_pages['cursors'])}"
+            grid = df[['id', 'name', 'brand', 'category', 'price', 'stock']].reset_index(drop=True)
+            edited = st.data_editor(
+                grid,
+                key=editor_key,
+                hide_index=True,
+                use_container_width=True,
+                disabled=['id', 'name', 'brand', 'category', 'price'],
+                column_config={
+                    'id': st.column_config.NumberColumn("ID"),
+                    'name': "Product",
+                    'brand': "Brand",
+                    'category': "Category",
+                    'price': st.column_config.NumberColumn("Price (₹)", format="%.0f"),
+                    'stock': st.column_config.NumberColumn("Stock", min_value=0, step=1)
+                }
+            )
+            changed = edited[edited['stock'].notna() & (edited['stock'] != grid['stock'])]
+            if st.button(f"Save Stock Changes ({len(changed)})", type="primary", disabled=changed.empty, key="save_stock"):
+                ok, msg = db.update_stock_bulk(dict(zip(changed['id'], changed['stock'])))
+                if ok:
+                    st.success(msg)
+                    del st.session_state[editor_key]
+                    st.rerun()
+                else:
+                    st.error(msg)
+        else:
+            for _,r in df.iterrows():
+                with st.container():
+                    c1,c2,c3,c4,c5 = st.columns([3,2,2,2,2])
+                    with c1:
+                        st.markdown(f"{r['name']}")
+                        st.caption(f"{r['brand']} | {r['category']}")
+                    with c2:
+                        st.markdown(f"*₹{r['price']:,.0f}*")
+                    with c3:
+                        col = "green" if r['stock']>10 else "orange" if r['stock']>0 else "red"
+                        st.markdown(f"<span style='color:{col};font-weight:600;'>Stock: {r['stock']}</span>", unsafe_allow_html=True)
+                    with c4:
+                        sts = r.get('stock_status','In Stock')
+                        if sts == 'In Stock':
+                            cls = 'status-instock'
+                        elif sts == 'Low Stock':
+                            cls = 'status-lowstock'
+                        else:
+                            cls = 'status-outofstock'
+                        st.markdown(f"<span class='status-badge {cls}'>{sts}</span>", unsafe_allow_html=True)
+                    with c5:
+                        if role=="admin":
+                            a1,a2 = st.columns(2)
+                            with a1:
+                                if st.button("🔄", key=f"t_{r['id']}", help="Toggle Status"):
+                                    st.info("Toggle functionality would be implemented here")
+                            with a2:
+                                if st.button("🗑", key=f"d_{r['id']}", help="Delete Product"):
+                                    if db.delete_product(r['id']):
+                                        st.success("Product deleted!")
+                                        st.rerun()
+                                    else:
+                                        st.error("Failed to delete product")
+                    st.divider()
+
+    if search:
+        if not df.empty or st.session_state.inv_search['page'] > 0:
+            draw_search_pager("inv_search")
+    elif not df.empty or len(st.session_state.inv_pages['cursors']) > 1:
+        draw_pager("inv_pages", total, page_size)
 
 # ----------------------------------------------------------------------
 # ORDERS / USERS / ADMIN PANEL
@@ -1181,11 +1586,53 @@ elif st.session_state.current_page == "Admin Panel" and role == "admin":
             st.rerun()
     with col2:
         if st.button("Generate Report", use_container_width=True):
-            st.info("Report generation feature would be implemented here")
+            st.session_state.show_report_form = not st.session_state.get("show_report_form", False)
     with col3:
         if st.button("System Backup", use_container_width=True):
             st.info("Backup functionality would be implemented here")
 
+    REPORT_DOWNLOAD_LIMIT = 10_000_000
+    if st.session_state.get("show_report_form"):
+        st.markdown("<h3 class='section-header'>Generate Report</h3>", unsafe_allow_html=True)
+        g1, g2, g3 = st.columns(3)
+        with g1:
+            report = st.selectbox("Report", list(db.REPORT_QUERIES), format_func=str.title, key="report_name")
+        with g2:
+            report_format = st.selectbox("Format", ["csv", "parquet"], format_func=str.upper, key="report_format")
+        with g3:
+            report_range = st.date_input("Date range (orders and sales)", value=(), key="report_range")
+        if st.button("Generate", type="primary", key="report_generate"):
+            start, end = report_range if len(report_range) == 2 else (None, None)
+            progress = st.empty()
+            result = db.export_report(report, file_format=report_format, start=start, end=end,
+                                      progress=lambda rows: progress.caption(f"{rows:,} rows written..."))
+            if result is None:
+                st.error("Report generation failed")
+            else:
+                st.session_state.last_report = result
+                progress.empty()
+        result = st.session_state.get("last_report")
+        if result and os.path.exists(result['path']):
+            size = os.path.getsize(result['path'])
+            st.success(f"{result['rows']:,} rows written to {result['path']} "
+                       f"({size / 1e6:,.1f} MB in {result['seconds']:.1f}s)")
+            # Downloads are served from memory, so the file is only read after
+            # an explicit request and very large files stay on disk only
+            if size <= REPORT_DOWNLOAD_LIMIT:
+                if st.session_state.get("report_download_path") != result['path']:
+                    if st.button("Prepare download", key="report_prepare"):
+                        st.session_state.report_download_path = result['path']
+                        st.rerun()
+                else:
+                    with open(result['path'], 'rb') as report_file:
+                        data = report_file.read()
+                    st.download_button("Download", data, file_name=os.path.basename(result['path']),
+                                       key="report_download",
+                                       on_click=lambda: st.session_state.pop("report_download_path", None))
+            else:
+                st.info(f"The file is larger than {REPORT_DOWNLOAD_LIMIT / 1e6:,.0f} MB; "
+                        f"collect it from the report directory on the server.")
+
 # ----------------------------------------------------------------------
 # FOOTER
 # ----------------------------------------------------------------------
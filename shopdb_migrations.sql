@@ -0,0 +1,235 @@
+-- StockFlow shopDB schema updates
+-- Apply in order against an existing shopDB database:
+--   mysql -u root -p shopDB < shopdb_migrations.sql
+
+USE shopDB;
+
+-- --------------------------------------------------
+-- Favorites: one row per (user, product)
+-- --------------------------------------------------
+-- Remove duplicate favorites left by earlier versions before adding the key.
+DELETE f1 FROM favorites f1
+JOIN favorites f2
+  ON f1.user_id = f2.user_id
+ AND f1.product_id = f2.product_id
+ AND f1.id > f2.id;
+
+-- Serves get_favorite_ids()/is_favorite() lookups and makes INSERT IGNORE
+-- in add_favorite() skip duplicates.
+ALTER TABLE favorites
+    ADD UNIQUE INDEX uq_favorites_user_product (user_id, product_id);
+
+-- --------------------------------------------------
+-- Purchases: per-user lookups and aggregates
+-- --------------------------------------------------
+-- Serves get_purchase_history() and the grouped get_customer_spend() query.
+CREATE INDEX idx_purchases_user_date ON purchases (user_id, purchase_date);
+
+-- --------------------------------------------------
+-- Product catalog: keyset pagination
+-- --------------------------------------------------
+-- get_products_page() orders by one of these columns and then Product_ID.
+-- InnoDB secondary indexes carry the primary key, so each index below is
+-- effectively (column, Product_ID) and serves both the ORDER BY and the
+-- cursor range.
+CREATE INDEX idx_product_model ON product (Model);
+CREATE INDEX idx_product_price ON product (Total_Price);
+CREATE INDEX idx_product_stock ON product (Stock_Qty);
+CREATE INDEX idx_product_category_model ON product (Unit_Type, Model);
+
+-- --------------------------------------------------
+-- Product search
+-- --------------------------------------------------
+-- search_products() ranks MATCH ... AGAINST on these two indexes. Without
+-- them the backend falls back to its in-process index.
+-- Note: InnoDB ignores words shorter than innodb_ft_min_token_size (3).
+ALTER TABLE product ADD FULLTEXT INDEX ft_product_model (Model);
+ALTER TABLE brand ADD FULLTEXT INDEX ft_brand_name (Brand_name);
+
+-- --------------------------------------------------
+-- Dashboard metrics summary
+-- --------------------------------------------------
+-- One row (id = 1) kept current by the purchase and product write paths,
+-- so the dashboard reads its totals without scanning purchases.
+CREATE TABLE IF NOT EXISTS metrics_summary (
+    id TINYINT PRIMARY KEY,
+    total_products INT NOT NULL DEFAULT 0,
+    total_orders INT NOT NULL DEFAULT 0,
+    active_customers INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(15,2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- Daily copies of the summary, used for the period-over-period changes.
+CREATE TABLE IF NOT EXISTS metrics_snapshot (
+    snapshot_date DATE PRIMARY KEY,
+    total_products INT NOT NULL,
+    total_orders INT NOT NULL,
+    active_customers INT NOT NULL,
+    revenue DECIMAL(15,2) NOT NULL
+);
+
+-- Seed from existing data (same as: python backend.py rebuild-metrics)
+REPLACE INTO metrics_summary (id, total_products, total_orders, active_customers, revenue)
+SELECT 1,
+       (SELECT COUNT(*) FROM product),
+       COUNT(*),
+       COUNT(DISTINCT user_id),
+       COALESCE(SUM(price * quantity), 0)
+FROM purchases;
+
+-- --------------------------------------------------
+-- Daily sales rollup
+-- --------------------------------------------------
+-- One row per day, category and brand, updated by every completed purchase.
+-- get_sales() answers day/week/month/year ranges from this table.
+-- brand_id 0 stands for products without a brand.
+CREATE TABLE IF NOT EXISTS sales_daily (
+    sale_date DATE NOT NULL,
+    category VARCHAR(50) NOT NULL,
+    brand_id INT NOT NULL,
+    revenue DECIMAL(15,2) NOT NULL DEFAULT 0,
+    units INT NOT NULL DEFAULT 0,
+    orders INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (sale_date, category, brand_id)
+);
+
+-- Lets the month-by-month rebuild read purchases by date range.
+CREATE INDEX idx_purchases_date ON purchases (purchase_date);
+
+-- Backfill from existing purchases with:
+--   python backend.py rebuild-sales-rollup
+
+-- --------------------------------------------------
+-- Best-seller leaderboard
+-- --------------------------------------------------
+-- Units and revenue per product per hour, updated by every completed
+-- purchase. The Top Products panel sums the buckets inside its window.
+CREATE TABLE IF NOT EXISTS product_sales_hourly (
+    sale_hour DATETIME NOT NULL,
+    product_id INT NOT NULL,
+    units INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(15,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (sale_hour, product_id)
+);
+
+-- Backfill the last 30 days, and drop older buckets (run daily from cron):
+--   python backend.py rebuild-top-sellers
+
+-- --------------------------------------------------
+-- Activity feed
+-- --------------------------------------------------
+-- Append-only event log behind the dashboard's Recent Activity panel.
+-- Readers page through it by id, so only the primary key is needed.
+CREATE TABLE IF NOT EXISTS activity_events (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    created_at DATETIME NOT NULL,
+    event_type VARCHAR(30) NOT NULL,
+    user_id INT NULL,
+    message VARCHAR(255) NOT NULL
+);
+
+-- --------------------------------------------------
+-- Inventory aggregates
+-- --------------------------------------------------
+-- Totals per category and brand, kept current by every product and purchase
+-- write. Feeds the category chart and the inventory value/low-stock figures.
+-- low_stock counts products below 10 units (LOW_STOCK_THRESHOLD in backend.py).
+CREATE TABLE IF NOT EXISTS inventory_aggregates (
+    category VARCHAR(50) NOT NULL,
+    brand_id INT NOT NULL,
+    product_count INT NOT NULL DEFAULT 0,
+    total_units BIGINT NOT NULL DEFAULT 0,
+    stock_value DECIMAL(18,2) NOT NULL DEFAULT 0,
+    low_stock INT NOT NULL DEFAULT 0,
+    out_of_stock INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (category, brand_id)
+);
+
+REPLACE INTO inventory_aggregates
+    (category, brand_id, product_count, total_units, stock_value, low_stock, out_of_stock)
+SELECT COALESCE(Unit_Type, 'Unknown'), COALESCE(Brand_ID, 0), COUNT(*),
+       COALESCE(SUM(Stock_Qty), 0), COALESCE(SUM(Total_Price * Stock_Qty), 0),
+       COALESCE(SUM(Stock_Qty < 10), 0), COALESCE(SUM(Stock_Qty <= 0), 0)
+FROM product
+GROUP BY COALESCE(Unit_Type, 'Unknown'), COALESCE(Brand_ID, 0);
+
+-- --------------------------------------------------
+-- Reorder thresholds and low-stock alerts
+-- --------------------------------------------------
+-- A product is low on stock below its own Reorder_Level, else its category's
+-- threshold, else 10 (LOW_STOCK_THRESHOLD in backend.py).
+ALTER TABLE product ADD COLUMN Reorder_Level INT NULL;
+
+CREATE TABLE IF NOT EXISTS reorder_thresholds (
+    category VARCHAR(50) PRIMARY KEY,
+    threshold INT NOT NULL
+);
+
+-- Exactly the products currently below their threshold, kept in step by
+-- every stock change.
+CREATE TABLE IF NOT EXISTS low_stock_alerts (
+    product_id INT PRIMARY KEY,
+    stock INT NOT NULL,
+    threshold INT NOT NULL,
+    since DATETIME NOT NULL,
+    INDEX idx_low_stock_alerts_stock (stock, product_id)
+);
+
+-- Every crossing of a threshold ('low' going under, 'cleared' going back
+-- over); readers follow it by id.
+CREATE TABLE IF NOT EXISTS low_stock_events (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    created_at DATETIME NOT NULL,
+    product_id INT NOT NULL,
+    event_type VARCHAR(10) NOT NULL,
+    stock INT NULL,
+    threshold INT NOT NULL
+);
+
+INSERT IGNORE INTO low_stock_alerts (product_id, stock, threshold, since)
+SELECT Product_ID, Stock_Qty, 10, NOW()
+FROM product
+WHERE Stock_Qty < 10;
+
+-- --------------------------------------------------
+-- Replenishment plan
+-- --------------------------------------------------
+-- Written by plan_replenishment() / 'python backend.py plan-replenishment'
+-- for every product with sales in the history window.
+CREATE TABLE IF NOT EXISTS replenishment_plan (
+    product_id INT PRIMARY KEY,
+    demand_rate DOUBLE NOT NULL,
+    demand_std DOUBLE NOT NULL,
+    lead_time_forecast DOUBLE NOT NULL,
+    safety_stock DOUBLE NOT NULL,
+    reorder_point INT NOT NULL,
+    suggested_qty INT NOT NULL,
+    computed_at DATETIME NOT NULL,
+    INDEX idx_replenishment_suggested (suggested_qty)
+);
+
+-- --------------------------------------------------
+-- Chat conversations
+-- --------------------------------------------------
+-- A user's newest conversation is their current one; "Clear Conversation"
+-- starts a new one. Messages are written in batches by the app and read
+-- back a page at a time in id order; message_key is generated by the app
+-- so a session can find its own messages once they are written.
+CREATE TABLE IF NOT EXISTS chat_conversations (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    started_at DATETIME NOT NULL,
+    INDEX idx_chat_conversations_user (user_id, id)
+);
+
+CREATE TABLE IF NOT EXISTS chat_messages (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    conversation_id BIGINT NOT NULL,
+    message_key CHAR(32) NOT NULL,
+    created_at DATETIME NOT NULL,
+    role VARCHAR(10) NOT NULL,
+    message TEXT NOT NULL,
+    UNIQUE KEY uq_chat_messages_key (message_key),
+    INDEX idx_chat_messages_conversation (conversation_id, id)
+);